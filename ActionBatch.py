@@ -0,0 +1,142 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import io
+import os
+import sys
+import json
+import time
+import multiprocessing
+import concurrent.futures
+from BaseAction import BaseAction
+from Tools import FileTools
+
+class _UnavailableStdin(io.TextIOBase):
+	# Operations must not read the manifest's stdin
+	_MESSAGE = "Operations in a batch cannot read from stdin (-)."
+
+	def read(self, size = -1):
+		raise OSError(self._MESSAGE)
+
+	def readline(self, size = -1):
+		raise OSError(self._MESSAGE)
+
+	@property
+	def buffer(self):
+		raise OSError(self._MESSAGE)
+
+class ActionBatch(BaseAction):
+	# Every manifest line is a JSON object describing one operation, either
+	#   { "argv": [ "bp2json", "-f", "in.txt", "out.json" ] }
+	# or
+	#   { "command": "bp2json", "args": [ "-f", "in.txt", "out.json" ] }
+	# optionally with an "id" that is copied to the result and a "cwd" to
+	# run the operation in. Operations may write to stdout ("-"), binary
+	# output is reported with surrogate escapes (see MultiCommand.execute),
+	# but cannot read from stdin.
+	_NOT_BATCHABLE = set([ "batch", "serve" ])
+	_multicommand = None
+
+	@classmethod
+	def _parse_operation(cls, line_no, line):
+		operation = json.loads(line)
+		if not isinstance(operation, dict):
+			raise ValueError("Operation must be a JSON object.")
+		if "argv" in operation:
+			argv = operation["argv"]
+		else:
+			argv = [ operation["command"] ] + operation.get("args", [ ])
+		if (not isinstance(argv, list)) or (len(argv) == 0) or (not all(isinstance(arg, str) for arg in argv)):
+			raise ValueError("Operation needs a non-empty list of string arguments.")
+		return { "line": line_no, "id": operation.get("id"), "argv": argv, "cwd": operation.get("cwd") }
+
+	@classmethod
+	def _execute(cls, operation):
+		result = { "line": operation["line"], "id": operation["id"], "argv": operation["argv"] }
+		if "error" in operation:
+			# Invalid manifest lines are reported without being executed
+			result.update({ "returncode": 1, "stdout": "", "stderr": operation["error"] + "\n", "duration": 0 })
+			return result
+		if cls._multicommand.resolve(operation["argv"][0]) in cls._NOT_BATCHABLE:
+			result.update({ "returncode": 1, "stdout": "", "stderr": "Command cannot be run in batch mode: %s\n" % (operation["argv"][0]), "duration": 0 })
+			return result
+
+		previous_cwd = os.getcwd()
+		(stdin, sys.stdin) = (sys.stdin, _UnavailableStdin())
+		t0 = time.perf_counter()
+		try:
+			if operation["cwd"] is not None:
+				os.chdir(operation["cwd"])
+			execution = cls._multicommand.execute(operation["argv"])
+			result.update(execution._asdict())
+		except OSError as e:
+			result.update({ "returncode": 1, "stdout": "", "stderr": "%s\n" % (str(e)) })
+		finally:
+			sys.stdin = stdin
+			os.chdir(previous_cwd)
+		result["duration"] = time.perf_counter() - t0
+		return result
+
+	def _operations(self, f):
+		for (line_no, line) in enumerate(f, 1):
+			line = line.strip()
+			if (line == "") or line.startswith("#"):
+				continue
+			try:
+				yield self._parse_operation(line_no, line)
+			except (ValueError, KeyError) as e:
+				yield { "line": line_no, "id": None, "argv": None, "error": "Invalid operation: %s" % (str(e)) }
+
+	def _run_operations(self, operations):
+		if (self._args.jobs == 1) or ("fork" not in multiprocessing.get_all_start_methods()):
+			yield from map(self._execute, operations)
+			return
+
+		# Workers are forked so that they inherit the registered commands
+		with concurrent.futures.ProcessPoolExecutor(max_workers = self._args.jobs, mp_context = multiprocessing.get_context("fork")) as executor:
+			yield from executor.map(self._execute, operations, chunksize = 4)
+
+	def _run_manifest(self, infile, outfile):
+		failed = 0
+		for result in self._run_operations(self._operations(infile)):
+			if result["returncode"] != 0:
+				failed += 1
+			outfile.write(json.dumps(result) + "\n")
+			outfile.flush()
+		return failed
+
+	def run(self):
+		ActionBatch._multicommand = self._args.multicommand
+		if (self._args.outfile is not None) and (not self._args.force) and FileTools.file_exists(self._args.outfile):
+			print("Refusing to overwrite: %s" % (self._args.outfile))
+			return 1
+
+		infile = sys.stdin if (self._args.manifest == "-") else open(self._args.manifest)
+		outfile = sys.stdout if (self._args.outfile is None) else open(self._args.outfile, "w")
+		try:
+			failed = self._run_manifest(infile, outfile)
+		finally:
+			if infile is not sys.stdin:
+				infile.close()
+			if outfile is not sys.stdout:
+				outfile.close()
+		if self._args.verbose >= 1:
+			print("%d operation(s) failed" % (failed), file = sys.stderr)
+		return 1 if (failed > 0) else 0
@@ -18,23 +18,49 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
-import os
 import json
+import itertools
 from BaseAction import BaseAction
 from Blueprint import Blueprint
+from Tools import FileTools
 
 class ActionBlueprintToJSON(BaseAction):
+	@classmethod
+	def write_json(cls, blueprints, outfile, table = False, pretty_print = False):
+		# Writes a single blueprint as a JSON document and several as JSON
+		# Lines (pretty printing then does not apply). Returns the number of
+		# blueprints written; nothing is written for an empty input.
+		blueprints = iter(blueprints)
+		first = list(itertools.islice(blueprints, 2))
+		if len(first) == 0:
+			return 0
+
+		to_dict = (lambda bp: bp.to_table_dict()) if table else (lambda bp: bp.to_dict())
+		count = 0
+		with FileTools.open_output(outfile) as f:
+			if len(first) == 1:
+				bp_dict = to_dict(first[0])
+				if pretty_print:
+					json.dump(bp_dict, f, indent = 4, sort_keys = True)
+					f.write("\n")
+				else:
+					json.dump(bp_dict, f)
+					if FileTools.is_stdio(outfile):
+						f.write("\n")
+				count = 1
+			else:
+				for bp in itertools.chain(first, blueprints):
+					json.dump(to_dict(bp), f)
+					f.write("\n")
+					count += 1
+		return count
+
 	def run(self):
-		if (not self._args.force) and os.path.exists(self._args.outfile):
+		if (not self._args.force) and FileTools.file_exists(self._args.outfile):
 			print("Refusing to overwrite: %s" % (self._args.outfile))
 			return 1
 
-		bp = Blueprint.read_from_file(self._args.infile, validate_hash = not self._args.ignore_corrupt)
-		bp_dict = bp.to_dict()
-
-		with open(self._args.outfile, "w") as f:
-			if self._args.pretty_print:
-				json.dump(bp_dict, f, indent = 4, sort_keys = True)
-				f.write("\n")
-			else:
-				json.dump(bp_dict, f)
+		blueprints = Blueprint.read_stream(self._args.infile, validate_hash = not self._args.ignore_corrupt)
+		if self.write_json(blueprints, self._args.outfile, table = (self._args.format == "table"), pretty_print = self._args.pretty_print) == 0:
+			print("No blueprint found in: %s" % (self._args.infile))
+			return 1
@@ -0,0 +1,125 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import sys
+import json
+import collections
+import concurrent.futures
+from BaseAction import BaseAction
+from BlueprintFingerprint import BlueprintFingerprint
+from Tools import FileTools
+
+class ActionDedupe(BaseAction):
+	@staticmethod
+	def _fingerprint_file(work_item):
+		(filename, normalize_positions, validate_hash) = work_item
+		try:
+			return (filename, BlueprintFingerprint.from_file(filename, normalize_positions = normalize_positions, validate_hash = validate_hash), None)
+		except Exception as e:
+			return (filename, None, "%s: %s" % (e.__class__.__name__, str(e)))
+
+	def _load_cache(self):
+		if (self._args.cache is None) or (not os.path.exists(self._args.cache)):
+			return { }
+		with open(self._args.cache) as f:
+			return json.load(f).get(self._cache_section, { })
+
+	def _save_cache(self, entries):
+		if self._args.cache is None:
+			return
+		cache = { }
+		if os.path.exists(self._args.cache):
+			with open(self._args.cache) as f:
+				cache = json.load(f)
+		cache[self._cache_section] = entries
+		with open(self._args.cache, "w") as f:
+			json.dump(cache, f)
+
+	def _fingerprint_all(self, filenames):
+		cached = self._load_cache()
+		entries = { }
+		fingerprints = { }
+		work_items = [ ]
+		for filename in filenames:
+			stat = os.stat(filename)
+			key = os.path.abspath(filename)
+			entry = cached.get(key)
+			if (entry is not None) and (entry["mtime_ns"] == stat.st_mtime_ns) and (entry["size"] == stat.st_size):
+				entries[key] = entry
+				fingerprints[filename] = BlueprintFingerprint.from_dict(entry["fingerprint"])
+			else:
+				entries[key] = { "mtime_ns": stat.st_mtime_ns, "size": stat.st_size }
+				work_items.append((filename, self._args.normalize_positions, not self._args.ignore_corrupt))
+
+		if self._args.verbose >= 1:
+			print("%d files, %d fingerprints cached, %d to compute" % (len(filenames), len(fingerprints), len(work_items)), file = sys.stderr)
+
+		with concurrent.futures.ProcessPoolExecutor(max_workers = self._args.jobs) as executor:
+			for (filename, fingerprint, error) in executor.map(self._fingerprint_file, work_items, chunksize = 16):
+				key = os.path.abspath(filename)
+				if fingerprint is None:
+					print("%s: %s" % (filename, error), file = sys.stderr)
+					del entries[key]
+					continue
+				entries[key]["fingerprint"] = fingerprint.to_dict()
+				fingerprints[filename] = fingerprint
+
+		self._save_cache(entries)
+		return fingerprints
+
+	def _near_duplicates(self, fingerprints, exact_groups):
+		# Only one representative per group of exact duplicates takes part
+		# in the near-duplicate search.
+		representatives = { group[0]: fingerprints[group[0]] for group in exact_groups }
+		buckets = collections.defaultdict(list)
+		for (filename, fingerprint) in representatives.items():
+			for band in fingerprint.lsh_bands():
+				buckets[band].append(filename)
+
+		pairs = { }
+		for candidates in buckets.values():
+			for (i, filename1) in enumerate(candidates):
+				for filename2 in candidates[i + 1 : ]:
+					pair = tuple(sorted((filename1, filename2)))
+					if pair not in pairs:
+						pairs[pair] = representatives[filename1].similarity(representatives[filename2])
+		return sorted(((similarity, pair) for (pair, similarity) in pairs.items() if similarity >= self._args.threshold), reverse = True)
+
+	def run(self):
+		self._cache_section = "normalized" if self._args.normalize_positions else "exact"
+		filenames = list(FileTools.find_files(self._args.infile))
+		fingerprints = self._fingerprint_all(filenames)
+
+		by_hash = collections.defaultdict(list)
+		for filename in filenames:
+			if filename in fingerprints:
+				by_hash[fingerprints[filename].content_hash].append(filename)
+		exact_groups = list(by_hash.values())
+
+		for group in exact_groups:
+			if len(group) > 1:
+				print("Identical content (%d files):" % (len(group)))
+				for filename in group:
+					print("    %s" % (filename))
+
+		if self._args.near:
+			for (similarity, (filename1, filename2)) in self._near_duplicates(fingerprints, exact_groups):
+				print("Similar (%.0f%%): %s  %s" % (similarity * 100, filename1, filename2))
@@ -0,0 +1,54 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+from BaseAction import BaseAction
+from Blueprint import Blueprint
+from BlueprintDiff import BlueprintDiff
+from Enums import DysonSphereItem
+
+class ActionDiff(BaseAction):
+	def _describe(self, building):
+		try:
+			item_name = DysonSphereItem(building.data.item_id).name
+		except ValueError:
+			item_name = f"[{building.data.item_id}]"
+		return "%s #%d at (%.2f, %.2f, %.2f)" % (item_name, building.data.index, building.data.local_offset_x, building.data.local_offset_y, building.data.local_offset_z)
+
+	def run(self):
+		old_bp = Blueprint.read_from_file(self._args.oldfile, validate_hash = not self._args.ignore_corrupt)
+		new_bp = Blueprint.read_from_file(self._args.newfile, validate_hash = not self._args.ignore_corrupt)
+		diff = BlueprintDiff(old_bp.decoded_data, new_bp.decoded_data)
+
+		for building in diff.removed:
+			print("- %s" % (self._describe(building)))
+		for building in diff.added:
+			print("+ %s" % (self._describe(building)))
+		for modification in diff.modified:
+			print("~ %s" % (self._describe(modification.new)))
+			if self._args.verbose >= 1:
+				for (name, (old_value, new_value)) in sorted(modification.changes.items()):
+					if name == "parameters":
+						print("      parameters changed (%d -> %d values)" % (len(old_value), len(new_value)))
+					elif name == "connections":
+						print("      connections changed")
+					else:
+						print("      %s: %s -> %s" % (name, old_value, new_value))
+		print("%d removed, %d added, %d modified" % (len(diff.removed), len(diff.added), len(diff.modified)))
+		return 0 if diff.identical else 1
@@ -18,6 +18,7 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
+import sys
 import json
 import collections
 from BaseAction import BaseAction
@@ -26,29 +27,48 @@ from Enums import DysonSphereItem
 
 class ActionDump(BaseAction):
 	def run(self):
+		failed = 0
 		for filename in self._args.infile:
 			if len(self._args.infile) > 1:
 				print(f"{filename}:")
-			bp = Blueprint.read_from_file(filename, validate_hash = not self._args.ignore_corrupt)
-			bpd = bp.decoded_data
-
-			building_counter = collections.Counter()
-			for building in bpd.buildings:
-				building_counter[building.data.item_id] += 1
-
-			if bp.short_desc != "":
-				print("Text          : %s" % (bp.short_desc))
-			if bp.long_desc != "":
-				print("Description   : %s" % (bp.long_desc))
-			if self._args.verbose >= 1:
-				print("Game version  : %s" % (bp.game_version))
-			print("Building count: %d" % (len(bpd.buildings)))
-			for (item_id, count) in building_counter.most_common():
-				try:
-					item = DysonSphereItem(item_id)
-					item_name = item.name
-				except ValueError:
-					item_name = f"[{item_id}]"
-				print("%5d  %s" % (count, item_name))
+			count = 0
+			try:
+				for bp in Blueprint.read_stream(filename, validate_hash = not self._args.ignore_corrupt):
+					if count > 0:
+						print()
+					self._dump(bp)
+					count += 1
+			except BrokenPipeError:
+				raise
+			except Exception as e:
+				failed += 1
+				print("%s: blueprint %d: %s: %s" % (filename, count + 1, e.__class__.__name__, str(e) or "malformed blueprint string"), file = sys.stderr)
+			else:
+				if count == 0:
+					failed += 1
+					print("No blueprint found in: %s" % (filename), file = sys.stderr)
 			if len(self._args.infile) > 1:
 				print()
+		return 1 if (failed > 0) else 0
+
+	def _dump(self, bp):
+		bpd = bp.decoded_data
+
+		building_counter = collections.Counter()
+		for building in bpd.buildings:
+			building_counter[building.data.item_id] += 1
+
+		if bp.short_desc != "":
+			print("Text          : %s" % (bp.short_desc))
+		if bp.long_desc != "":
+			print("Description   : %s" % (bp.long_desc))
+		if self._args.verbose >= 1:
+			print("Game version  : %s" % (bp.game_version))
+		print("Building count: %d" % (len(bpd.buildings)))
+		for (item_id, count) in building_counter.most_common():
+			try:
+				item = DysonSphereItem(item_id)
+				item_name = item.name
+			except ValueError:
+				item_name = f"[{item_id}]"
+			print("%5d  %s" % (count, item_name))
@@ -19,16 +19,26 @@
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
 import os
+import sys
 from BaseAction import BaseAction
 from Blueprint import Blueprint
+from Tools import FileTools
 
 class ActionEdit(BaseAction):
+	def _edit(self, bp):
+		if self._args.short_desc is not None:
+			bp.short_desc = self._args.short_desc
+		return bp
+
 	def run(self):
-		if (not self._args.force) and os.path.exists(self._args.outfile):
+		if (not self._args.force) and FileTools.file_exists(self._args.outfile):
 			print("Refusing to overwrite: %s" % (self._args.outfile))
 			return 1
 
-		bp = Blueprint.read_from_file(self._args.infile, validate_hash = not self._args.ignore_corrupt)
-		if self._args.short_desc is not None:
-			bp.short_desc = self._args.short_desc
-		bp.write_to_file(self._args.outfile)
+		blueprints = Blueprint.read_stream(self._args.infile, validate_hash = not self._args.ignore_corrupt)
+		if FileTools.file_exists(self._args.infile) and FileTools.file_exists(self._args.outfile) and os.path.samefile(self._args.infile, self._args.outfile):
+			# Editing in place, read everything before truncating the file
+			blueprints = list(blueprints)
+		if Blueprint.write_stream((self._edit(bp) for bp in blueprints), self._args.outfile, smallest = self._args.smallest, time_budget = self._args.time_budget) == 0:
+			print("No blueprint found in: %s" % (self._args.infile), file = sys.stderr)
+			return 1
@@ -0,0 +1,38 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import sys
+from BaseAction import BaseAction
+from BlueprintIndex import BlueprintIndex
+from Tools import FileTools
+
+class ActionIndex(BaseAction):
+	def _error(self, filename, exception):
+		print("%s: %s: %s" % (filename, exception.__class__.__name__, str(exception)), file = sys.stderr)
+
+	def run(self):
+		index = BlueprintIndex(self._args.dbfile)
+		try:
+			result = index.update(FileTools.find_files(self._args.infile), validate_hash = not self._args.ignore_corrupt, error_callback = self._error)
+		finally:
+			index.close()
+		if self._args.verbose >= 1:
+			print("%d indexed, %d unchanged, %d touched, %d removed, %d failed" % (result.indexed, result.unchanged, result.touched, result.removed, result.failed))
+		return 1 if (result.failed > 0) else 0
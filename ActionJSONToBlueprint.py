@@ -18,27 +18,34 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
-import os
 import json
 from BaseAction import BaseAction
 from Blueprint import Blueprint
+from Tools import FileTools
 
 class ActionJSONToBlueprint(BaseAction):
+	def _read_dicts(self):
+		# Either a single JSON document or JSON Lines, as written by bp2json
+		# for a stream of several blueprints.
+		with FileTools.open_input(self._args.infile) as f:
+			text = f.read()
+		try:
+			yield json.loads(text)
+		except json.JSONDecodeError as e:
+			if e.msg != "Extra data":
+				raise
+			for line in text.split("\n"):
+				if line.strip() != "":
+					yield json.loads(line)
+
 	def run(self):
-		if (not self._args.force) and os.path.exists(self._args.outfile):
+		if (not self._args.force) and FileTools.file_exists(self._args.outfile):
 			print("Refusing to overwrite: %s" % (self._args.outfile))
 			return 1
 
-		with open(self._args.infile) as f:
-			bp_dict = json.load(f)
-		print(bp_dict)
-
-#		bp = Blueprint.read_from_file(self._args.infile, validate_hash = not self._args.ignore_corrupt)
-#		bp_dict = bp.to_dict()
-#
-#		with open(self._args.outfile, "w") as f:
-#			if self._args.pretty_print:
-#				json.dump(bp_dict, f, indent = 4, sort_keys = True)
-#				f.write("\n")
-#			else:
-#				json.dump(bp_dict, f)
+		try:
+			blueprints = [ Blueprint.from_dict(bp_dict) for bp_dict in self._read_dicts() ]
+		except (ValueError, KeyError) as e:
+			print("Cannot convert %s: %s" % (self._args.infile, str(e)))
+			return 1
+		Blueprint.write_stream(blueprints, self._args.outfile, smallest = self._args.smallest, time_budget = self._args.time_budget)
@@ -0,0 +1,49 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import sys
+from BaseAction import BaseAction
+from Blueprint import Blueprint
+from BlueprintData import BlueprintData
+from Tools import FileTools
+
+class ActionMerge(BaseAction):
+	def run(self):
+		if (not self._args.force) and FileTools.file_exists(self._args.outfile):
+			print("Refusing to overwrite: %s" % (self._args.outfile))
+			return 1
+
+		blueprints = [ bp for filename in self._args.infile for bp in Blueprint.read_stream(filename, validate_hash = not self._args.ignore_corrupt) ]
+		if len(blueprints) == 0:
+			print("No blueprints to merge.")
+			return 1
+		try:
+			merged = BlueprintData.merge(bp.decoded_data for bp in blueprints)
+		except ValueError as e:
+			print("Cannot merge: %s" % (str(e)))
+			return 1
+		if self._args.verbose >= 1:
+			print("Merged %d blueprints: %d areas, %d buildings" % (len(blueprints), len(merged.areas), len(merged.buildings)), file = sys.stderr if FileTools.is_stdio(self._args.outfile) else sys.stdout)
+
+		bp = blueprints[0]
+		bp.raw_data = merged.serialize()
+		if self._args.short_desc is not None:
+			bp.short_desc = self._args.short_desc
+		bp.write_to_file(self._args.outfile)
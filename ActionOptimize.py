@@ -0,0 +1,57 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2021 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+
+import os
+import sys
+from BaseAction import BaseAction
+from Blueprint import Blueprint
+from BlueprintOptimizer import BlueprintOptimizer
+from Tools import FileTools
+
+class ActionOptimize(BaseAction):
+	def _optimize(self, bp, report):
+		original_length = len(bp.serialize())
+		optimizer = BlueprintOptimizer(bp.decoded_data)
+		strategies = None if (self._args.strategy == "best") else [ self._args.strategy ]
+		results = optimizer.optimize(strategies)
+		if self._args.verbose >= 1:
+			for result in results:
+				print("    %-12s %9d bytes compressed" % (result.strategy, result.compressed_size), file = report)
+
+		best = results[0]
+		if best.strategy != "original":
+			bp.raw_data = best.data
+		optimized_length = len(bp.serialize())
+		print("%s: %d -> %d bytes (%.1f%% smaller) using %s order" % (bp.short_desc, original_length, optimized_length, 100 * (original_length - optimized_length) / original_length, best.strategy), file = report)
+		return bp
+
+	def run(self):
+		if (not self._args.force) and FileTools.file_exists(self._args.outfile):
+			print("Refusing to overwrite: %s" % (self._args.outfile))
+			return 1
+
+		report = sys.stderr if FileTools.is_stdio(self._args.outfile) else sys.stdout
+		blueprints = Blueprint.read_stream(self._args.infile, validate_hash = not self._args.ignore_corrupt)
+		if FileTools.file_exists(self._args.infile) and FileTools.file_exists(self._args.outfile) and os.path.samefile(self._args.infile, self._args.outfile):
+			blueprints = list(blueprints)
+		if Blueprint.write_stream((self._optimize(bp, report) for bp in blueprints), self._args.outfile) == 0:
+			print("No blueprint found in: %s" % (self._args.infile), file = sys.stderr)
+			return 1
@@ -0,0 +1,80 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+from BaseAction import BaseAction
+from BlueprintArchive import BlueprintArchive
+from Tools import FileTools
+
+class ActionPack(BaseAction):
+	def _member_names(self):
+		members = [ ]
+		for path in self._args.infile:
+			base = path if os.path.isdir(path) else os.path.dirname(path)
+			for filename in FileTools.find_files([ path ]):
+				members.append((os.path.relpath(filename, base), filename))
+		return members
+
+	def _read(self, filename):
+		with open(filename) as f:
+			return f.read()
+
+	def _train_dictionary(self, members):
+		if self._args.dict_samples == 0:
+			return b""
+		step = max(1, len(members) // self._args.dict_samples)
+		samples = [ ]
+		for (name, filename) in members[::step]:
+			try:
+				samples.append(BlueprintArchive.payload_of(self._read(filename)))
+			except Exception:
+				continue
+		return BlueprintArchive.train_dictionary(samples)
+
+	def _report_error(self, name, error):
+		# Called for the member that was yielded last (or failed to be read)
+		self._failed += 1
+		print("Skipped %s (member %s): %s" % (self._current_filename, name, str(error)))
+
+	def _members(self, members):
+		for (name, filename) in members:
+			self._current_filename = filename
+			if self._args.verbose >= 2:
+				print(name)
+			try:
+				bp_string = self._read(filename)
+			except (OSError, UnicodeDecodeError) as e:
+				self._report_error(name, e)
+				continue
+			yield (name, bp_string)
+
+	def run(self):
+		if (not self._args.force) and os.path.exists(self._args.archive):
+			print("Refusing to overwrite: %s" % (self._args.archive))
+			return 1
+
+		self._failed = 0
+		self._current_filename = None
+		members = self._member_names()
+		zdict = self._train_dictionary(members)
+		count = BlueprintArchive.create(self._args.archive, self._members(members), zdict = zdict, error_callback = self._report_error)
+		if self._args.verbose >= 1:
+			print("Packed %d blueprints into %s (%d bytes, %d bytes dictionary)" % (count, self._args.archive, os.stat(self._args.archive).st_size, len(zdict)))
+		return 1 if (self._failed > 0) else 0
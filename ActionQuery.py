@@ -0,0 +1,57 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import sys
+from BaseAction import BaseAction
+from Blueprint import Blueprint
+from BuildingTable import BuildingTable
+from BuildingQuery import BuildingQuery, InvalidQueryException
+from Tools import FileTools
+
+class ActionQuery(BaseAction):
+	def run(self):
+		if (self._args.outfile is not None) and (not self._args.force) and FileTools.file_exists(self._args.outfile):
+			print("Refusing to overwrite: %s" % (self._args.outfile))
+			return 1
+
+		try:
+			query = BuildingQuery(self._args.expression)
+			fieldnames = [ BuildingQuery.resolve_fieldname(name.strip()) for name in self._args.fields.split(",") ] if (self._args.fields is not None) else None
+		except InvalidQueryException as e:
+			print("Invalid query: %s" % (str(e)))
+			return 1
+
+		bp = Blueprint.read_from_file(self._args.infile, validate_hash = not self._args.ignore_corrupt)
+		table = BuildingTable(bp.raw_data)
+		positions = query.select(table)
+
+		# When the selection is written to stdout, the report goes to stderr
+		report = sys.stderr if ((self._args.outfile is not None) and FileTools.is_stdio(self._args.outfile)) else sys.stdout
+		if fieldnames is not None:
+			columns = [ table.column(fieldname) for fieldname in fieldnames ]
+			print("\t".join(fieldnames), file = report)
+			for position in positions:
+				print("\t".join(str(column[position]) for column in columns), file = report)
+		else:
+			print(len(positions), file = report)
+
+		if self._args.outfile is not None:
+			bp.raw_data = bp.decode(lazy = True).subset(positions).serialize()
+			bp.write_to_file(self._args.outfile)
@@ -0,0 +1,84 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2021 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+
+import os
+import sys
+import concurrent.futures
+from BaseAction import BaseAction
+from Blueprint import Blueprint
+from BlueprintRenderer import BlueprintRenderer
+from Tools import FileTools
+
+class ActionRender(BaseAction):
+	@staticmethod
+	def _render_file(work_item):
+		(infile, outfile, size, validate_hash) = work_item
+		try:
+			bp = Blueprint.read_from_file(infile, validate_hash = validate_hash)
+			renderer = BlueprintRenderer(size = size)
+			png = renderer.to_png(bp.decode(lazy = True))
+			with FileTools.open_output(outfile, "wb") as f:
+				f.write(png)
+			warning = None if (renderer.skipped_buildings == 0) else ("%d building(s) in nonexistent or invalid areas not drawn" % (renderer.skipped_buildings))
+			return (infile, outfile, None, warning)
+		except Exception as e:
+			return (infile, outfile, "%s: %s" % (e.__class__.__name__, str(e)), None)
+
+	def _outfile(self, infile, root):
+		if FileTools.is_stdio(infile):
+			return FileTools.STDIO
+		if self._args.output_dir is None:
+			return os.path.splitext(infile)[0] + ".png"
+		relpath = os.path.relpath(infile, root) if os.path.isdir(root) else os.path.basename(infile)
+		return os.path.join(self._args.output_dir, os.path.splitext(relpath)[0] + ".png")
+
+	def _render_all(self, work_items):
+		if (self._args.jobs == 1) or (len(work_items) < 2):
+			yield from map(self._render_file, work_items)
+			return
+		with concurrent.futures.ProcessPoolExecutor(max_workers = self._args.jobs) as executor:
+			yield from executor.map(self._render_file, work_items, chunksize = 8)
+
+	def run(self):
+		work_items = [ ]
+		for root in self._args.infile:
+			for infile in FileTools.find_files([ root ]):
+				outfile = self._outfile(infile, root)
+				if (not self._args.force) and FileTools.file_exists(outfile):
+					print("Refusing to overwrite: %s" % (outfile))
+					continue
+				work_items.append((infile, outfile, self._args.size, not self._args.ignore_corrupt))
+
+		for work_item in work_items:
+			if not FileTools.is_stdio(work_item[1]):
+				os.makedirs(os.path.dirname(work_item[1]) or ".", exist_ok = True)
+
+		failed = 0
+		for (infile, outfile, error, warning) in self._render_all(work_items):
+			if error is not None:
+				failed += 1
+				print("%s: %s" % (infile, error))
+				continue
+			if warning is not None:
+				print("%s: %s" % (infile, warning), file = sys.stderr)
+			if (self._args.verbose >= 1) and (not FileTools.is_stdio(outfile)):
+				print("%s -> %s" % (infile, outfile))
+		return 1 if (failed > 0) else 0
@@ -0,0 +1,75 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import sys
+from BaseAction import BaseAction
+from Blueprint import Blueprint
+from BuildingTable import BuildingTable
+from Tools import FileTools
+
+class ActionReplace(BaseAction):
+	def _get_substitutions(self):
+		return {
+			"item_id":		dict(self._args.item),
+			"model_index":	dict(self._args.model),
+			"recipe_id":	dict(self._args.recipe),
+			"filter_id":	dict(self._args.filter),
+		}
+
+	def _replace(self, bp, substitutions, filename):
+		table = BuildingTable(bp.raw_data)
+		changed = table.replace(substitutions)
+		if self._args.verbose >= 1:
+			print("%s: %d field(s) changed" % (filename, changed), file = sys.stderr if FileTools.is_stdio(filename) else sys.stdout)
+		bp.raw_data = table.data
+		return changed
+
+	def _replace_stream(self, filename, substitutions):
+		for bp in Blueprint.read_stream(filename, validate_hash = not self._args.ignore_corrupt):
+			self._replace(bp, substitutions, filename)
+			yield bp
+
+	def run(self):
+		if self._args.output_dir is not None:
+			os.makedirs(self._args.output_dir, exist_ok = True)
+
+		substitutions = self._get_substitutions()
+		for filename in self._args.infile:
+			if FileTools.is_stdio(filename):
+				# A stream on stdin is always written to stdout
+				Blueprint.write_stream(self._replace_stream(filename, substitutions), FileTools.STDIO)
+				continue
+
+			if self._args.in_place:
+				outfile = filename
+			else:
+				outfile = os.path.join(self._args.output_dir, os.path.basename(filename))
+				if (not self._args.force) and os.path.exists(outfile):
+					print("Refusing to overwrite: %s" % (outfile))
+					continue
+
+			# Files may contain a stream of blueprints as well; they are read
+			# completely before the output (possibly the same file) is written
+			blueprints = list(Blueprint.read_stream(filename, validate_hash = not self._args.ignore_corrupt))
+			changed = sum(self._replace(bp, substitutions, filename) for bp in blueprints)
+			if (changed == 0) and self._args.in_place:
+				continue
+			Blueprint.write_stream(blueprints, outfile)
@@ -0,0 +1,41 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+from BaseAction import BaseAction
+from BlueprintIndex import BlueprintIndex
+
+class ActionSearch(BaseAction):
+	def run(self):
+		if not os.path.exists(self._args.dbfile):
+			print("No such index database: %s" % (self._args.dbfile))
+			return 1
+
+		index = BlueprintIndex(self._args.dbfile)
+		try:
+			results = index.search(self._args.item, text = self._args.text)
+		finally:
+			index.close()
+
+		for (filename, short_desc, building_count) in results:
+			if self._args.verbose >= 1:
+				print("%-60s %6d  %s" % (filename, building_count, short_desc))
+			else:
+				print(filename)
@@ -0,0 +1,38 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import sys
+from BaseAction import BaseAction
+from BlueprintServer import BlueprintServer
+
+class ActionServe(BaseAction):
+	def run(self):
+		try:
+			server = BlueprintServer(self._args.multicommand, self._args.address, cache_size = self._args.cache_size, allow_remote = self._args.allow_remote, token = os.environ.get("DSPBPTK_SERVER_TOKEN"))
+		except ValueError as e:
+			print("Error: %s" % (str(e)), file = sys.stderr)
+			return 1
+		if self._args.verbose >= 1:
+			print("Listening on %s" % (self._args.address))
+		try:
+			server.run()
+		except KeyboardInterrupt:
+			pass
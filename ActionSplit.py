@@ -0,0 +1,46 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+from BaseAction import BaseAction
+from Blueprint import Blueprint
+
+class ActionSplit(BaseAction):
+	def run(self):
+		if (self._args.tile_size is None) and (self._args.max_buildings is None):
+			print("Either --tile-size or --max-buildings must be given.")
+			return 1
+
+		bp = Blueprint.read_from_file(self._args.infile, validate_hash = not self._args.ignore_corrupt)
+		parts = bp.decoded_data.split(tile_size = self._args.tile_size, max_buildings = self._args.max_buildings)
+
+		(basename, extension) = os.path.splitext(os.path.basename(self._args.infile))
+		os.makedirs(self._args.output_dir, exist_ok = True)
+		short_desc = bp.short_desc
+		for (part_no, part) in enumerate(parts, 1):
+			outfile = os.path.join(self._args.output_dir, "%s_%03d%s" % (basename, part_no, extension))
+			if (not self._args.force) and os.path.exists(outfile):
+				print("Refusing to overwrite: %s" % (outfile))
+				continue
+			if self._args.verbose >= 1:
+				print("%s: %d buildings" % (outfile, len(part.buildings)))
+			bp.raw_data = part.serialize()
+			bp.short_desc = "%s (%d/%d)" % (short_desc, part_no, len(parts))
+			bp.write_to_file(outfile)
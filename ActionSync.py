@@ -0,0 +1,144 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2021 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+
+import os
+import json
+import concurrent.futures
+from BaseAction import BaseAction
+from Blueprint import Blueprint
+from ActionBlueprintToJSON import ActionBlueprintToJSON
+from Tools import FileTools
+
+class ActionSync(BaseAction):
+	# The manifest records, for every source file (by path relative to the
+	# source directory), its size, mtime and the MD5F values stored in it.
+	# A file is only converted again if its size or mtime changed and, in
+	# that case, if the stored MD5F values differ as well (i.e., touching a
+	# file only refreshes its manifest entry).
+	_MANIFEST_VERSION = 1
+	_MANIFEST_FILENAME = ".dspbptk-sync.json"
+
+	@staticmethod
+	def _sync_file(work_item):
+		(source, target, previous_hashes, options) = work_item
+		tmp_target = target + ".tmp"
+		try:
+			stat = os.stat(source)
+			bp_strings = [ bp_string for (line_no, bp_string) in Blueprint.read_blueprint_strings(source) ]
+			hashes = [ bp_string.rsplit("\"", 1)[-1].upper() for bp_string in bp_strings ]
+			entry = { "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "hashes": hashes }
+			if (hashes == previous_hashes) and os.path.exists(target):
+				return (entry, "unchanged", None)
+
+			blueprints = (Blueprint.from_blueprint_string(bp_string, validate_hash = options["validate_hash"]) for bp_string in bp_strings)
+			os.makedirs(os.path.dirname(target) or ".", exist_ok = True)
+			if ActionBlueprintToJSON.write_json(blueprints, tmp_target, table = (options["format"] == "table"), pretty_print = options["pretty_print"]) == 0:
+				return (None, "failed", "no blueprint found")
+			os.replace(tmp_target, target)
+			return (entry, "converted", None)
+		except Exception as e:
+			if os.path.exists(tmp_target):
+				os.unlink(tmp_target)
+			return (None, "failed", "%s: %s" % (e.__class__.__name__, str(e)))
+
+	def _target_filename(self, relpath):
+		return os.path.join(self._args.target_dir, os.path.splitext(relpath)[0] + ".json")
+
+	def _load_manifest(self, options):
+		try:
+			with open(self._manifest_filename) as f:
+				manifest = json.load(f)
+		except FileNotFoundError:
+			return { }
+		if (manifest.get("version") != self._MANIFEST_VERSION) or (manifest.get("options") != options):
+			# Output settings changed, so everything needs to be converted again
+			return { relpath: None for relpath in manifest.get("files", { }) }
+		return manifest["files"]
+
+	def _save_manifest(self, options, files):
+		tmp_filename = self._manifest_filename + ".tmp"
+		with open(tmp_filename, "w") as f:
+			json.dump({ "version": self._MANIFEST_VERSION, "options": options, "files": files }, f)
+		os.replace(tmp_filename, self._manifest_filename)
+
+	def _remove_output(self, relpath):
+		target = self._target_filename(relpath)
+		if os.path.exists(target):
+			os.unlink(target)
+		# Prune directories that became empty, up to the target directory
+		directory = os.path.dirname(target)
+		while os.path.abspath(directory) != os.path.abspath(self._args.target_dir):
+			try:
+				os.rmdir(directory)
+			except OSError:
+				break
+			directory = os.path.dirname(directory)
+
+	def _sync_files(self, work_items):
+		if (self._args.jobs == 1) or (len(work_items) < 2):
+			yield from map(self._sync_file, work_items)
+			return
+		with concurrent.futures.ProcessPoolExecutor(max_workers = self._args.jobs) as executor:
+			yield from executor.map(self._sync_file, work_items, chunksize = 16)
+
+	def run(self):
+		if not os.path.isdir(self._args.source_dir):
+			print("Not a directory: %s" % (self._args.source_dir))
+			return 1
+		os.makedirs(self._args.target_dir, exist_ok = True)
+		self._manifest_filename = self._args.manifest or os.path.join(self._args.target_dir, self._MANIFEST_FILENAME)
+
+		# Only options that affect the output are part of the manifest
+		options = { "format": self._args.format, "pretty_print": self._args.pretty_print }
+		convert_options = dict(options, validate_hash = not self._args.ignore_corrupt)
+		previous = self._load_manifest(options)
+		files = { }
+		work_items = [ ]
+		for source in FileTools.find_files([ self._args.source_dir ]):
+			relpath = os.path.relpath(source, self._args.source_dir)
+			entry = previous.get(relpath)
+			stat = os.stat(source)
+			if (entry is not None) and (entry["mtime_ns"] == stat.st_mtime_ns) and (entry["size"] == stat.st_size) and os.path.exists(self._target_filename(relpath)):
+				files[relpath] = entry
+				continue
+			work_items.append((relpath, (source, self._target_filename(relpath), None if (entry is None) else entry["hashes"], convert_options)))
+
+		counts = { "converted": 0, "unchanged": 0, "failed": 0, "removed": 0 }
+		try:
+			results = self._sync_files([ work_item for (relpath, work_item) in work_items ])
+			for ((relpath, work_item), (entry, status, error)) in zip(work_items, results):
+				counts[status] += 1
+				if entry is not None:
+					files[relpath] = entry
+				if error is not None:
+					print("%s: %s" % (work_item[0], error))
+				elif (self._args.verbose >= 1) and (status == "converted"):
+					print("Converted %s" % (work_item[0]))
+		finally:
+			for relpath in sorted(set(previous) - set(files) - set(relpath for (relpath, work_item) in work_items)):
+				self._remove_output(relpath)
+				counts["removed"] += 1
+				if self._args.verbose >= 1:
+					print("Removed %s" % (self._target_filename(relpath)))
+			self._save_manifest(options, files)
+
+		print("%d converted, %d unchanged, %d up to date, %d removed, %d failed" % (counts["converted"], counts["unchanged"], len(files) - counts["converted"] - counts["unchanged"], counts["removed"], counts["failed"]))
+		return 1 if (counts["failed"] > 0) else 0
@@ -0,0 +1,45 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import sys
+from BaseAction import BaseAction
+from Blueprint import Blueprint
+from BuildingTable import BuildingTable
+from Tools import FileTools
+
+class ActionTransform(BaseAction):
+	def _transform(self, bp):
+		table = BuildingTable(bp.raw_data)
+		table.transform(translate = self._args.translate, rotate = self._args.rotate, center = self._args.center, mirror = self._args.mirror)
+		bp.raw_data = table.data
+		return bp
+
+	def run(self):
+		if (not self._args.force) and FileTools.file_exists(self._args.outfile):
+			print("Refusing to overwrite: %s" % (self._args.outfile))
+			return 1
+
+		blueprints = Blueprint.read_stream(self._args.infile, validate_hash = not self._args.ignore_corrupt)
+		if FileTools.file_exists(self._args.infile) and FileTools.file_exists(self._args.outfile) and os.path.samefile(self._args.infile, self._args.outfile):
+			blueprints = list(blueprints)
+		if Blueprint.write_stream((self._transform(bp) for bp in blueprints), self._args.outfile) == 0:
+			print("No blueprint found in: %s" % (self._args.infile), file = sys.stderr)
+			return 1
@@ -0,0 +1,61 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+from BaseAction import BaseAction
+from BlueprintArchive import BlueprintArchive
+
+class ActionUnpack(BaseAction):
+	def _extract(self, name, bp_string):
+		outfile = os.path.normpath(os.path.join(self._args.output_dir, name))
+		if os.path.isabs(name) or os.path.relpath(outfile, self._args.output_dir).startswith(".."):
+			print("Refusing to extract outside of output directory: %s" % (name))
+			return
+		if (not self._args.force) and os.path.exists(outfile):
+			print("Refusing to overwrite: %s" % (outfile))
+			return
+		if self._args.verbose >= 1:
+			print(name)
+		os.makedirs(os.path.dirname(outfile), exist_ok = True)
+		with open(outfile, "w") as f:
+			f.write(bp_string)
+
+	def run(self):
+		archive = BlueprintArchive(self._args.archive)
+		try:
+			if self._args.list:
+				for member in archive.members:
+					print("%s  %-7s %8d  %s" % (member.hash_value, member.mode, member.length, member.name))
+			elif len(self._args.member) == 0:
+				for (name, bp_string) in archive:
+					self._extract(name, bp_string)
+			else:
+				for name in self._args.member:
+					if name in archive:
+						self._extract(name, archive.get(name))
+					else:
+						try:
+							member = archive.member_by_hash(name)
+						except KeyError:
+							print("No such archive member: %s" % (name))
+							continue
+						self._extract(member.name, archive.get(member.name))
+		finally:
+			archive.close()
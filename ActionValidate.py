@@ -0,0 +1,77 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2021 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+
+import concurrent.futures
+from BaseAction import BaseAction
+from Blueprint import Blueprint
+from Tools import FileTools
+
+class ActionValidate(BaseAction):
+	@staticmethod
+	def _validate_file(work_item):
+		# Returns a list of (name, issues, error) tuples, one per blueprint
+		# in the file; streams name their blueprints by line number.
+		(filename, validate_hash) = work_item
+		results = [ ]
+		try:
+			bp_strings = list(Blueprint.read_blueprint_strings(filename))
+		except (OSError, ValueError) as e:
+			return [ (filename, None, "%s: %s" % (e.__class__.__name__, str(e))) ]
+		for (line_no, bp_string) in bp_strings:
+			name = "%s:%d" % (filename, line_no) if (FileTools.is_stdio(filename) or (len(bp_strings) > 1)) else filename
+			try:
+				bp = Blueprint.from_blueprint_string(bp_string, validate_hash = validate_hash)
+				issues = [ ("building %d: %s" % (issue.building, issue.message)) if (issue.building is not None) else issue.message for issue in bp.decoded_data.validate() ]
+				results.append((name, issues, None))
+			except Exception as e:
+				results.append((name, None, "%s: %s" % (e.__class__.__name__, str(e))))
+		return results
+
+	def _results(self, filenames):
+		validate_hash = not self._args.ignore_corrupt
+		# stdin cannot be handed to a worker process
+		local = [ filename for filename in filenames if FileTools.is_stdio(filename) ]
+		remote = [ (filename, validate_hash) for filename in filenames if not FileTools.is_stdio(filename) ]
+		for filename in local:
+			yield from self._validate_file((filename, validate_hash))
+		if (self._args.jobs == 1) or (len(remote) < 2):
+			for work_item in remote:
+				yield from self._validate_file(work_item)
+		else:
+			with concurrent.futures.ProcessPoolExecutor(max_workers = self._args.jobs) as executor:
+				for results in executor.map(self._validate_file, remote, chunksize = 4):
+					yield from results
+
+	def run(self):
+		failed = 0
+		for (name, issues, error) in self._results(list(FileTools.find_files(self._args.infile))):
+			if error is not None:
+				failed += 1
+				print("%s: %s" % (name, error))
+			elif len(issues) > 0:
+				failed += 1
+				for issue in issues:
+					print("%s: %s" % (name, issue))
+			elif self._args.verbose >= 1:
+				print("%s: OK" % (name))
+		if self._args.verbose >= 1:
+			print("%d blueprint(s) with problems" % (failed))
+		return 1 if (failed > 0) else 0
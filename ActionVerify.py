@@ -0,0 +1,79 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import itertools
+from BaseAction import BaseAction
+from Blueprint import Blueprint, InvalidHashValueException
+from Tools import FileTools
+
+class ActionVerify(BaseAction):
+	_BATCH_SIZE = 256
+
+	def _verify(self, name, bp_string, hash_valid):
+		try:
+			if hash_valid is False:
+				raise InvalidHashValueException("Blueprint string has invalid has value.")
+			Blueprint.from_blueprint_string(bp_string, validate_hash = hash_valid is None)
+			if self._args.verbose >= 1:
+				print("OK      %s" % (name))
+			return True
+		except InvalidHashValueException:
+			print("BADHASH %s" % (name))
+		except Exception as e:
+			print("CORRUPT %s: %s" % (name, str(e)))
+		return False
+
+	def _blueprint_strings(self):
+		# Yields (name, blueprint string) of all blueprints or (name, None) if
+		# a file cannot be read at all.
+		for filename in FileTools.find_files(self._args.infile):
+			try:
+				bp_strings = Blueprint.read_blueprint_strings(filename)
+				first = list(itertools.islice(bp_strings, 2))
+			except (OSError, ValueError) as e:
+				print("CORRUPT %s: %s" % (filename, str(e)))
+				yield (filename, None)
+				continue
+
+			# Blueprints of a stream are identified by their line number
+			is_stream = FileTools.is_stdio(filename) or (len(first) > 1)
+			if len(first) == 0:
+				print("CORRUPT %s: no blueprint found" % (filename))
+				yield (filename, None)
+			for (line_no, bp_string) in itertools.chain(first, bp_strings):
+				name = "%s:%d" % (filename, line_no) if is_stream else filename
+				yield (name, bp_string)
+
+	def run(self):
+		# Hashes of many blueprints are computed in lockstep, so blueprints
+		# are verified in batches.
+		failed = 0
+		blueprint_strings = self._blueprint_strings()
+		while True:
+			batch = list(itertools.islice(blueprint_strings, self._BATCH_SIZE))
+			if len(batch) == 0:
+				break
+			readable = [ (name, bp_string) for (name, bp_string) in batch if (bp_string is not None) ]
+			failed += len(batch) - len(readable)
+			hash_valid = Blueprint.validate_hashes([ bp_string for (name, bp_string) in readable ])
+			for ((name, bp_string), valid) in zip(readable, hash_valid):
+				if not self._verify(name, bp_string, valid):
+					failed += 1
+		return 1 if (failed > 0) else 0
@@ -22,7 +22,11 @@ class BaseAction():
 	def __init__(self, cmdname, args):
 		self._cmd = cmdname
 		self._args = args
-		self.run()
+		self._returncode = self.run() or 0
+
+	@property
+	def returncode(self):
+		return self._returncode
 
 	def run(self):
 		raise NotImplementedError()
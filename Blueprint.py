@@ -18,18 +18,48 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
+import os
+import copy
+import zlib
+import time
+import queue
+import itertools
+import collections
 import datetime
-import gzip
 import base64
 import urllib.parse
-from MD5 import DysonSphereMD5
-from Tools import DateTimeTools
+from MD5 import DysonSphereMD5, MultiBufferMD5
+from Tools import DateTimeTools, FileTools
 from BlueprintData import BlueprintData
+from Profiler import Profiler
+
+class InvalidHashValueException(Exception): pass
 
 class Blueprint():
-	def __init__(self, game_version, data, layout = 10, icon0 = 0, icon1 = 0, icon2 = 0, icon3 = 0, icon4 = 0, timestamp = None, short_desc = "Short description", long_desc = "Long description"):
-		if timestamp is None:
-			timestamp = DateTimeTools.csharp_now()
+	# Above this size, hashing and (de)compression are run concurrently.
+	# zlib releases the GIL while it works, so the pure Python MD5F can
+	# run in parallel with it.
+	_THREADING_THRESHOLD = 64 * 1024
+	# Blueprints of a stream have their hashes computed in lockstep, this
+	# many at a time.
+	_HASH_BATCH_SIZE = 256
+	CompressionSettings = collections.namedtuple("CompressionSettings", [ "level", "strategy", "mem_level", "window_bits" ])
+	_DEFAULT_COMPRESSION = CompressionSettings(level = 9, strategy = zlib.Z_DEFAULT_STRATEGY, mem_level = 8, window_bits = 15)
+	_COMPRESSION_CHUNK_SIZE = 1024 * 1024
+	# Compression only overlaps with hashing once there is more than one
+	# chunk to compress.
+	_SERIALIZE_THREADING_THRESHOLD = 2 * _COMPRESSION_CHUNK_SIZE
+	_executor = None
+	_file_cache = None
+	_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+	_TIMESTAMP_FORMAT_SECONDS = "%Y-%m-%d %H:%M:%S"
+
+	def __init__(self, game_version, data, layout = 10, icon0 = 0, icon1 = 0, icon2 = 0, icon3 = 0, icon4 = 0, timestamp = None, short_desc = "Short description", long_desc = "Long description", timestamp_ticks = None):
+		# The timestamp is kept as the original C# tick value (100 ns
+		# resolution), so that it is serialized exactly as it was read.
+		if timestamp_ticks is None:
+			timestamp_ticks = DateTimeTools.csharp_now() if (timestamp is None) else DateTimeTools.datetime_to_csharp(timestamp)
+		timestamp = DateTimeTools.csharp_to_datetime(timestamp_ticks)
 		self._layout = layout
 		self._icon0 = icon0
 		self._icon1 = icon1
@@ -37,10 +67,12 @@ class Blueprint():
 		self._icon3 = icon3
 		self._icon4 = icon4
 		self._timestamp = timestamp
+		self._timestamp_ticks = timestamp_ticks
 		self._game_version = game_version
 		self._short_desc = short_desc
 		self._long_desc = long_desc
 		self._data = data
+		self._decoded = { }
 
 	@property
 	def timestamp(self):
@@ -50,6 +82,11 @@ class Blueprint():
 	def timestamp(self, value):
 		assert(isinstance(value, datetime.datetime))
 		self._timestamp = value
+		self._timestamp_ticks = DateTimeTools.datetime_to_csharp(value)
+
+	@property
+	def timestamp_ticks(self):
+		return self._timestamp_ticks
 
 	@property
 	def game_version(self):
@@ -73,19 +110,91 @@ class Blueprint():
 		assert(isinstance(value, str))
 		self._long_desc = value
 
+	@property
+	def raw_data(self):
+		return self._data
+
+	@raw_data.setter
+	def raw_data(self, value):
+		assert(isinstance(value, (bytes, bytearray)))
+		self._data = bytes(value)
+		self._decoded = { }
+
 	@property
 	def decoded_data(self):
-		return BlueprintData.deserialize(self._data)
+		return self.decode()
+
+	def decode(self, lazy = False):
+		if lazy:
+			return BlueprintData.deserialize(self._data, lazy = True)
+		if "data" not in self._decoded:
+			self._decoded["data"] = BlueprintData.deserialize(self._data)
+		return self._decoded["data"]
+
+	def copy(self):
+		# Copies share the (immutable) payload and its decoded form until
+		# the payload of one of them is replaced.
+		return copy.copy(self)
+
+	@classmethod
+	def set_file_cache(cls, file_cache):
+		cls._file_cache = file_cache
+
+	@classmethod
+	def _use_threads(cls, length, threshold = None):
+		threshold = cls._THREADING_THRESHOLD if (threshold is None) else threshold
+		return (length >= threshold) and ((os.cpu_count() or 1) > 1)
+
+	@classmethod
+	def _get_executor(cls):
+		if cls._executor is None:
+			import concurrent.futures
+			cls._executor = concurrent.futures.ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "dspbptk-zlib")
+		return cls._executor
+
+	@classmethod
+	def _reset_executor(cls):
+		# A forked child inherits the executor, but not its worker thread
+		cls._executor = None
+
+	@staticmethod
+	def _split_hash(bp_string):
+		index = bp_string.rindex("\"")
+		return (bp_string[:index], bp_string[index + 1 : ].lower().strip())
 
 	@classmethod
-	def from_blueprint_string(cls, bp_string, validate_hash = True):
-		if validate_hash:
-			index = bp_string.rindex("\"")
-			hashed_data = bp_string[:index]
-			ref_value = bp_string[index + 1 : ].lower().strip()
+	def _validate_hash(cls, bp_string):
+		(hashed_data, ref_value) = cls._split_hash(bp_string)
+		with Profiler.stage("blueprint.md5f", bytes_in = len(hashed_data)):
 			hash_value = DysonSphereMD5(DysonSphereMD5.Variant.MD5F).update(hashed_data.encode("utf-8")).hexdigest()
-			if ref_value != hash_value:
-				raise InvalidHashValueException("Blueprint string has invalid has value.")
+		if ref_value != hash_value:
+			raise InvalidHashValueException("Blueprint string has invalid has value.")
+
+	@classmethod
+	def validate_hashes(cls, bp_strings):
+		# Checks the hashes of many blueprint strings at once. Returns a list
+		# with True or False for every blueprint string, or None if it does
+		# not contain a hash at all.
+		split = [ cls._split_hash(bp_string) if ("\"" in bp_string) else None for bp_string in bp_strings ]
+		hashed_data = [ item[0].encode("utf-8") for item in split if (item is not None) ]
+		with Profiler.stage("blueprint.md5f", bytes_in = sum(len(data) for data in hashed_data)):
+			hash_values = iter(MultiBufferMD5(DysonSphereMD5.Variant.MD5F).hexdigests(hashed_data))
+		return [ None if (item is None) else (item[1] == next(hash_values)) for item in split ]
+
+	@staticmethod
+	def _decode_payload(b64data):
+		with Profiler.stage("blueprint.base64_decode", bytes_in = len(b64data)) as stage:
+			compressed = base64.b64decode(b64data)
+			stage.bytes_out = len(compressed)
+		with Profiler.stage("blueprint.inflate", bytes_in = len(compressed)) as stage:
+			data = zlib.decompress(compressed, 16 + 15)
+			stage.bytes_out = len(data)
+		return data
+
+	@classmethod
+	def from_blueprint_string(cls, bp_string, validate_hash = True, threaded = None):
+		if threaded is None:
+			threaded = validate_hash and cls._use_threads(len(bp_string))
 
 		assert(bp_string.startswith("BLUEPRINT:"))
 		components = bp_string[10:].split(",")
@@ -93,25 +202,135 @@ class Blueprint():
 		assert(len(components) == 12)
 		(fixed0_1, layout, icon0, icon1, icon2, icon3, icon4, fixed0_2, timestamp, game_version, short_desc, b64data_hash) = components
 
+		b64data_hash_split = b64data_hash.split("\"")
+		assert(len(b64data_hash_split) == 3)
+		(long_desc, b64data, hash_value) = b64data_hash_split
+
+		if threaded:
+			# Inflate in the background while MD5F runs in this thread
+			future = cls._get_executor().submit(cls._decode_payload, b64data)
+			if validate_hash:
+				cls._validate_hash(bp_string)
+			data = future.result()
+		else:
+			if validate_hash:
+				cls._validate_hash(bp_string)
+			data = cls._decode_payload(b64data)
+
 		(fixed0_1, layout, icon0, icon1, icon2, icon3, icon4, fixed0_2, timestamp) = (int(fixed0_1), int(layout), int(icon0), int(icon1), int(icon2), int(icon3), int(icon4), int(fixed0_2), int(timestamp))
 		assert(fixed0_1 == 0)
 		assert(fixed0_2 == 0)
-		timestamp = DateTimeTools.csharp_to_datetime(timestamp)
 		short_desc = urllib.parse.unquote(short_desc)
+		long_desc = urllib.parse.unquote(long_desc)
+		return cls(layout = layout, icon0 = icon0, icon1 = icon1, icon2 = icon2, icon3 = icon3, icon4 = icon4, timestamp_ticks = timestamp, game_version = game_version, short_desc = short_desc, long_desc = long_desc, data = data)
 
-		b64data_hash_split = b64data_hash.split("\"")
-		assert(len(b64data_hash_split) == 3)
+	@classmethod
+	def _new_compressor(cls, settings = None):
+		# gzip stream with zero mtime, so that serialization is reproducible.
+		settings = settings or cls._DEFAULT_COMPRESSION
+		return zlib.compressobj(settings.level, zlib.DEFLATED, 16 + settings.window_bits, settings.mem_level, settings.strategy)
 
-		(long_desc, b64data, hash_value) = b64data_hash_split
-		long_desc = urllib.parse.unquote(long_desc)
-		compressed_data = base64.b64decode(b64data)
-		data = gzip.decompress(compressed_data)
-		return cls(layout = layout, icon0 = icon0, icon1 = icon1, icon2 = icon2, icon3 = icon3, icon4 = icon4, timestamp = timestamp, game_version = game_version, short_desc = short_desc, long_desc = long_desc, data = data)
+	@classmethod
+	def _compress(cls, data, settings = None):
+		compressor = cls._new_compressor(settings)
+		return compressor.compress(data) + compressor.flush()
+
+	@classmethod
+	def compressed_size(cls, data):
+		return len(cls._compress(data))
+
+	@classmethod
+	def _compression_candidates(cls):
+		# Most promising settings first, so that a tight time budget still
+		# tries the ones that usually win.
+		for level in (9, 8, 7, 6):
+			for strategy in (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED, zlib.Z_RLE):
+				for mem_level in (9, 8):
+					for window_bits in (15, 14):
+						settings = cls.CompressionSettings(level = level, strategy = strategy, mem_level = mem_level, window_bits = window_bits)
+						if settings != cls._DEFAULT_COMPRESSION:
+							yield settings
+
+	@classmethod
+	def smallest_compression(cls, data, time_budget = None):
+		# Compress with many different zlib settings in parallel (zlib
+		# releases the GIL) and return the (settings, gzip stream) tuple of
+		# the smallest result. The default settings are always tried first.
+		# Once time_budget seconds have passed, no further settings are tried
+		# and compressions that are still running are abandoned. Without a
+		# budget, the result is deterministic.
+		import concurrent.futures
+		with Profiler.stage("blueprint.compression_search", bytes_in = len(data)) as stage:
+			deadline = None if (time_budget is None) else time.monotonic() + time_budget
+			best = (0, cls._DEFAULT_COMPRESSION, cls._compress(data))
+			workers = os.cpu_count() or 1
+			candidates = enumerate(cls._compression_candidates(), 1)
+			executor = concurrent.futures.ThreadPoolExecutor(max_workers = workers, thread_name_prefix = "dspbptk-deflate")
+			pending = { }
+			try:
+				while True:
+					while len(pending) < workers:
+						(order, settings) = next(candidates, (None, None))
+						if settings is None:
+							break
+						pending[executor.submit(cls._compress, data, settings)] = (order, settings)
+					if len(pending) == 0:
+						break
+					timeout = None if (deadline is None) else max(0, deadline - time.monotonic())
+					(done, not_done) = concurrent.futures.wait(pending, timeout = timeout, return_when = concurrent.futures.FIRST_COMPLETED)
+					for future in done:
+						(order, settings) = pending.pop(future)
+						compressed = future.result()
+						if (len(compressed), order) < (len(best[2]), best[0]):
+							best = (order, settings, compressed)
+					if (deadline is not None) and (time.monotonic() >= deadline):
+						break
+			finally:
+				executor.shutdown(wait = False, cancel_futures = True)
+
+			(order, settings, compressed) = best
+			if (settings != cls._DEFAULT_COMPRESSION) and (zlib.decompress(compressed, 16 + 15) != data):
+				(settings, compressed) = (cls._DEFAULT_COMPRESSION, cls._compress(data))
+			stage.bytes_out = len(compressed)
+		return (settings, compressed)
+
+	def _compress_chunks(self):
+		# The stream is never flushed in between, so the output does not
+		# depend on whether it is produced in a thread or not; zlib still
+		# emits most of a chunk's compressed data right away, which can be
+		# hashed while the next chunk is being compressed.
+		compressor = self._new_compressor()
+		for offset in range(0, len(self._data), self._COMPRESSION_CHUNK_SIZE):
+			chunk = self._data[offset : offset + self._COMPRESSION_CHUNK_SIZE]
+			with Profiler.stage("blueprint.deflate", bytes_in = len(chunk)) as stage:
+				compressed = compressor.compress(chunk)
+				stage.bytes_out = len(compressed)
+			yield compressed
+		with Profiler.stage("blueprint.deflate", bytes_in = 0) as stage:
+			compressed = compressor.flush()
+			stage.bytes_out = len(compressed)
+		yield compressed
+
+	def _produce_compressed_chunks(self, chunk_queue):
+		try:
+			for chunk in self._compress_chunks():
+				chunk_queue.put(chunk)
+			chunk_queue.put(None)
+		except Exception as e:
+			chunk_queue.put(e)
 
-	def serialize(self):
-		compressed_data = gzip.compress(self._data)
-		b64_data = base64.b64encode(compressed_data).decode("ascii")
+	def _threaded_compressed_chunks(self):
+		chunk_queue = queue.Queue()
+		self._get_executor().submit(self._produce_compressed_chunks, chunk_queue)
+		while True:
+			chunk = chunk_queue.get()
+			if chunk is None:
+				break
+			if isinstance(chunk, Exception):
+				raise chunk
+			yield chunk
 
+	def _serialize_header(self):
 		components = [ ]
 		components.append("0")
 		components.append(str(self._layout))
@@ -121,31 +340,179 @@ class Blueprint():
 		components.append(str(self._icon3))
 		components.append(str(self._icon4))
 		components.append("0")
-		components.append(str(DateTimeTools.datetime_to_csharp(self._timestamp)))
+		components.append(str(self._timestamp_ticks))
 		components.append(self._game_version)
 		components.append(urllib.parse.quote(self._short_desc))
-		header = "BLUEPRINT:" + ",".join(components)
-		hashed_data = header + ",\"" + b64_data
-		hash_value = DysonSphereMD5(DysonSphereMD5.Variant.MD5F).update(hashed_data.encode("utf-8")).hexdigest()
-		return hashed_data + "\"" + hash_value.upper()
+		return "BLUEPRINT:" + ",".join(components) + ",\""
 
-	def to_dict(self):
+	def serialize(self, threaded = None, smallest = False, time_budget = None):
+		# With smallest, the payload is compressed with the zlib settings
+		# that give the shortest string (see smallest_compression).
+		if smallest:
+			chunks = [ self.smallest_compression(self._data, time_budget = time_budget)[1] ]
+		else:
+			if threaded is None:
+				threaded = self._use_threads(len(self._data), threshold = self._SERIALIZE_THREADING_THRESHOLD)
+			chunks = self._threaded_compressed_chunks() if threaded else self._compress_chunks()
+
+		# Base64-encode and hash each compressed chunk as soon as it is
+		# available; only full 3-byte groups are encoded until the end.
+		header = self._serialize_header()
+		md5f = DysonSphereMD5(DysonSphereMD5.Variant.MD5F).update(header.encode("utf-8"))
+		b64_parts = [ ]
+		pending = b""
+		for chunk in chunks:
+			pending += chunk
+			encodable_length = len(pending) - (len(pending) % 3)
+			with Profiler.stage("blueprint.base64_encode", bytes_in = encodable_length) as stage:
+				b64_part = base64.b64encode(pending[ : encodable_length])
+				stage.bytes_out = len(b64_part)
+			pending = pending[encodable_length : ]
+			with Profiler.stage("blueprint.md5f", bytes_in = len(b64_part)):
+				md5f.update(b64_part)
+			b64_parts.append(b64_part)
+		b64_part = base64.b64encode(pending)
+		with Profiler.stage("blueprint.md5f", bytes_in = len(b64_part)):
+			md5f.update(b64_part)
+			hexdigest = md5f.hexdigest()
+		b64_parts.append(b64_part)
+
+		hashed_data = header + b"".join(b64_parts).decode("ascii")
+		return hashed_data + "\"" + hexdigest.upper()
+
+	def _metadata_dict(self):
 		return {
 			"icon": {
 				"layout": self._layout,
 				"images": [ self._icon0, self._icon1, self._icon2, self._icon3, self._icon4 ],
 			},
-			"timestamp": self._timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+			"timestamp": self._timestamp.strftime(self._TIMESTAMP_FORMAT),
+			"timestamp_ticks": self._timestamp_ticks,
 			"game_version": self._game_version,
 			"short_desc": self._short_desc,
-			"data": self.decoded_data.to_dict(),
+			"long_desc": self._long_desc,
 		}
 
+	def to_dict(self):
+		result = self._metadata_dict()
+		result["data"] = self.decoded_data.to_dict()
+		return result
+
+	def to_table_dict(self):
+		result = self._metadata_dict()
+		result["format"] = "table"
+		result["data"] = self.decoded_data.to_table_dict()
+		return result
+
+	@classmethod
+	def from_dict(cls, bp_dict):
+		# Accepts the output of both to_dict and to_table_dict.
+		(icon0, icon1, icon2, icon3, icon4) = bp_dict["icon"]["images"]
+		data = BlueprintData.from_dict(bp_dict["data"]).serialize()
+		timestamp_format = cls._TIMESTAMP_FORMAT if ("." in bp_dict["timestamp"]) else cls._TIMESTAMP_FORMAT_SECONDS
+		timestamp = datetime.datetime.strptime(bp_dict["timestamp"], timestamp_format)
+		# The exact tick value is only used if the readable timestamp was not
+		# edited
+		timestamp_ticks = bp_dict.get("timestamp_ticks")
+		if (timestamp_ticks is not None) and (DateTimeTools.csharp_to_datetime(timestamp_ticks) != timestamp):
+			timestamp_ticks = None
+		return cls(layout = bp_dict["icon"]["layout"], icon0 = icon0, icon1 = icon1, icon2 = icon2, icon3 = icon3, icon4 = icon4, timestamp = timestamp, timestamp_ticks = timestamp_ticks, game_version = bp_dict["game_version"], short_desc = bp_dict["short_desc"], long_desc = bp_dict.get("long_desc", ""), data = data)
+
 	@classmethod
 	def read_from_file(cls, filename, validate_hash = True):
+		if FileTools.is_stdio(filename):
+			blueprints = cls.read_stream(filename, validate_hash = validate_hash)
+			bp = next(blueprints, None)
+			if bp is None:
+				raise ValueError("No blueprint found on stdin.")
+			if next(blueprints, None) is not None:
+				raise ValueError("Expected a single blueprint on stdin, but found several.")
+			return bp
+		if cls._file_cache is not None:
+			return cls._file_cache.read(filename, validate_hash = validate_hash)
 		with open(filename) as f:
 			return cls.from_blueprint_string(f.read(), validate_hash = validate_hash)
 
-	def write_to_file(self, filename):
-		with open(filename, "w") as f:
-			f.write(self.serialize())
+	@classmethod
+	def read_blueprint_strings(cls, filename):
+		# A blueprint stream contains one blueprint string per line; a regular
+		# blueprint file is simply a stream of length one. Yields (line number,
+		# blueprint string) tuples while reading the input line by line.
+		with FileTools.open_input(filename) as f:
+			for (line_no, line) in enumerate(f, 1):
+				line = line.strip()
+				if line != "":
+					yield (line_no, line)
+
+	@classmethod
+	def read_stream(cls, filename, validate_hash = True):
+		bp_strings = cls.read_blueprint_strings(filename)
+		first = next(bp_strings, None)
+		if first is None:
+			return
+		second = next(bp_strings, None)
+		if (second is None) and (cls._file_cache is not None) and (not FileTools.is_stdio(filename)):
+			# Single blueprint files go through the file cache
+			yield cls.read_from_file(filename, validate_hash = validate_hash)
+			return
+
+		if (second is not None) and validate_hash and (not FileTools.is_stdio(filename)):
+			# Stream files are hashed in batches; stdin is not, so that every
+			# blueprint is passed on as soon as it arrives.
+			bp_strings = (bp_string for (line_no, bp_string) in itertools.chain([ first, second ], bp_strings))
+			while True:
+				batch = list(itertools.islice(bp_strings, cls._HASH_BATCH_SIZE))
+				if len(batch) == 0:
+					break
+				for (bp_string, valid) in zip(batch, cls.validate_hashes(batch)):
+					if not valid:
+						# Raises the appropriate exception
+						cls._validate_hash(bp_string)
+					yield cls.from_blueprint_string(bp_string, validate_hash = False)
+			return
+
+		yield cls.from_blueprint_string(first[1], validate_hash = validate_hash)
+		if second is not None:
+			yield cls.from_blueprint_string(second[1], validate_hash = validate_hash)
+			for (line_no, bp_string) in bp_strings:
+				yield cls.from_blueprint_string(bp_string, validate_hash = validate_hash)
+
+	def write_to_file(self, filename, smallest = False, time_budget = None):
+		self.write_stream([ self ], filename, smallest = smallest, time_budget = time_budget)
+
+	@classmethod
+	def write_stream(cls, blueprints, filename, smallest = False, time_budget = None):
+		# Blueprints are separated by newlines, so a single blueprint file is
+		# written without a trailing newline. On stdout, every blueprint line
+		# is terminated and flushed immediately for the next pipeline stage.
+		# Returns the number of blueprints written.
+		to_stdout = FileTools.is_stdio(filename)
+		count = 0
+		with FileTools.open_output(filename) as f:
+			for (bp_no, bp) in enumerate(blueprints):
+				count += 1
+				bp_string = bp.serialize(smallest = smallest, time_budget = time_budget)
+				if to_stdout:
+					f.write(bp_string + "\n")
+					f.flush()
+				else:
+					if bp_no > 0:
+						f.write("\n")
+					f.write(bp_string)
+		return count
+
+if hasattr(os, "register_at_fork"):
+	os.register_at_fork(after_in_child = Blueprint._reset_executor)
+
+if __name__ == "__main__":
+	import random
+
+	# Threaded and unthreaded serialization must give the identical string
+	rng = random.Random(0)
+	for length in [ 0, 1000, Blueprint._COMPRESSION_CHUNK_SIZE - 1, Blueprint._COMPRESSION_CHUNK_SIZE + 1, 2 * Blueprint._COMPRESSION_CHUNK_SIZE + 12345 ]:
+		data = ((rng.randbytes(4096) + bytes(60000)) * (length // 64096 + 1))[:length]
+		bp = Blueprint(game_version = "0.8.23.9989", data = data)
+		bp_string = bp.serialize(threaded = False)
+		assert(bp.serialize(threaded = True) == bp_string)
+		assert(Blueprint.from_blueprint_string(bp_string, threaded = True).raw_data == data)
+	print("Passed testcases.")
@@ -0,0 +1,272 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import json
+import zlib
+import base64
+import collections
+from NamedStruct import NamedStruct
+from Blueprint import Blueprint
+from BlueprintData import BlueprintData, BlueprintBuilding
+
+class InvalidArchiveException(Exception): pass
+
+class BlueprintArchive():
+	# Archive layout:
+	#   header | member blobs | preset dictionary | index
+	# Every member blob is zlib-compressed with the shared preset dictionary
+	# and holds the blueprint string text around the Base64 data plus
+	# either the decompressed payload (if the original gzip stream can be
+	# recreated bit-exactly with zlib) or the original gzip stream itself.
+	# The index is zlib-compressed JSON and maps member names to offsets.
+	_MAGIC = b"DSPBPA\x00"
+	_VERSION = 1
+	_HEADER = NamedStruct((
+		("7s", "magic"),
+		("B", "version"),
+		("L", "member_count"),
+		("Q", "zdict_offset"),
+		("L", "zdict_length"),
+		("Q", "index_offset"),
+		("L", "index_length"),
+	))
+	_BLOB_HEADER = NamedStruct((
+		("L", "prefix_length"),
+		("L", "suffix_length"),
+	))
+	_GZIP_TRAILER_LENGTH = 8
+	_MAX_ZDICT_LENGTH = 32768
+	_RECREATE_PARAMETERS = [ (level, mem_level) for level in (9, 6, 1, 2, 3, 4, 5, 7, 8, 0) for mem_level in (8, 9) ]
+	# gzip_crc is the CRC-32 of the original gzip stream, used to check that
+	# re-deflating a payload gave the same bytes. Archives written before it
+	# was introduced do not have it; their members are checked by MD5F.
+	Member = collections.namedtuple("Member", [ "name", "hash_value", "offset", "length", "mode", "level", "mem_level", "gzip_header", "gzip_crc" ], defaults = [ None ])
+
+	def __init__(self, filename):
+		self._f = open(filename, "rb")
+		header = self._HEADER.unpack_from_file(self._f)
+		if (header.magic != self._MAGIC) or (header.version != self._VERSION):
+			raise InvalidArchiveException("%s is not a blueprint archive of version %d." % (filename, self._VERSION))
+		self._f.seek(header.zdict_offset)
+		self._zdict = self._f.read(header.zdict_length)
+		self._f.seek(header.index_offset)
+		index = json.loads(zlib.decompress(self._f.read(header.index_length)))
+		self._members = [ self.Member(**entry) for entry in index ]
+		self._by_name = { member.name: member for member in self._members }
+		self._by_hash = { }
+		for member in self._members:
+			self._by_hash.setdefault(member.hash_value, member)
+
+	@property
+	def members(self):
+		return self._members
+
+	def __len__(self):
+		return len(self._members)
+
+	def __contains__(self, name):
+		return name in self._by_name
+
+	@classmethod
+	def _split_blueprint_string(cls, bp_string):
+		first_quote = bp_string.find("\"")
+		last_quote = bp_string.rfind("\"")
+		if (not bp_string.startswith("BLUEPRINT:")) or (first_quote == last_quote):
+			raise ValueError("Not a blueprint string.")
+		prefix = bp_string[ : first_quote + 1]
+		b64data = bp_string[first_quote + 1 : last_quote]
+		suffix = bp_string[last_quote : ]
+		return (prefix, b64data, suffix)
+
+	@classmethod
+	def _gzip_header_length(cls, gzip_data):
+		# Only plain gzip headers (no extra fields, names or comments) can be
+		# recreated; everything else is stored verbatim.
+		if (len(gzip_data) < 18) or (gzip_data[0 : 3] != b"\x1f\x8b\x08") or (gzip_data[3] != 0):
+			return None
+		return 10
+
+	@classmethod
+	def _recreate_deflate(cls, payload, deflate_data):
+		for (level, mem_level) in cls._RECREATE_PARAMETERS:
+			compressor = zlib.compressobj(level, zlib.DEFLATED, -15, mem_level)
+			if (compressor.compress(payload) + compressor.flush()) == deflate_data:
+				return (level, mem_level)
+		return None
+
+	@classmethod
+	def _encode_member(cls, bp_string):
+		(prefix, b64data, suffix) = cls._split_blueprint_string(bp_string)
+		gzip_data = base64.b64decode(b64data)
+		hash_value = suffix[1 : ].strip().lower()
+		if base64.b64encode(gzip_data).decode("ascii") != b64data:
+			# Non-canonical Base64, keep the whole string as it is
+			return ("text", None, None, None, None, hash_value, b"", bp_string.encode("utf-8"), b"")
+
+		header_length = cls._gzip_header_length(gzip_data)
+		if header_length is not None:
+			payload = zlib.decompress(gzip_data, 16 + 15)
+			deflate_data = gzip_data[header_length : -cls._GZIP_TRAILER_LENGTH]
+			trailer = gzip_data[-cls._GZIP_TRAILER_LENGTH : ]
+			expected_trailer = zlib.crc32(payload).to_bytes(4, byteorder = "little") + (len(payload) & 0xffffffff).to_bytes(4, byteorder = "little")
+			if trailer == expected_trailer:
+				parameters = cls._recreate_deflate(payload, deflate_data)
+				if parameters is not None:
+					(level, mem_level) = parameters
+					return ("payload", level, mem_level, gzip_data[ : header_length].hex(), zlib.crc32(gzip_data), hash_value, prefix.encode("utf-8"), payload, suffix.encode("utf-8"))
+		return ("gzip", None, None, None, None, hash_value, prefix.encode("utf-8"), gzip_data, suffix.encode("utf-8"))
+
+	@classmethod
+	def payload_of(cls, bp_string):
+		(prefix, b64data, suffix) = cls._split_blueprint_string(bp_string)
+		return zlib.decompress(base64.b64decode(b64data), 16 + 15)
+
+	@classmethod
+	def train_dictionary(cls, payloads, max_length = _MAX_ZDICT_LENGTH):
+		# Collect the byte strings that occur most often across the sample:
+		# the non-positional tail of the fixed building records and whole
+		# parameter blocks. The most frequent ones go to the end of the
+		# dictionary, where zlib can reference them most cheaply.
+		fragments = collections.Counter()
+		fixed_size = BlueprintBuilding._BLUEPRINT_BUILDING.size
+		tail_offset = BlueprintBuilding._BLUEPRINT_BUILDING.offsetof("item_id")
+		for payload in payloads:
+			fragments[payload[ : BlueprintData._HEADER.size]] += 1
+			offsets = BlueprintData.building_offsets(payload)
+			for (start, end) in zip(offsets, offsets[1:]):
+				fragments[payload[start + tail_offset : start + fixed_size]] += 1
+				if end > start + fixed_size:
+					fragments[payload[start + fixed_size : end]] += 1
+
+		zdict = bytearray()
+		for (fragment, count) in fragments.most_common():
+			if count < 2:
+				break
+			if len(zdict) + len(fragment) > max_length:
+				continue
+			zdict[0 : 0] = fragment
+		return bytes(zdict)
+
+	@classmethod
+	def create(cls, filename, members, zdict = b"", error_callback = None):
+		# members is an iterable of (name, blueprint string) tuples. Members
+		# that cannot be encoded (and duplicate names) raise ValueError or,
+		# with an error_callback, are reported and skipped. The archive is
+		# written to a temporary file and only replaces filename once it is
+		# complete.
+		zdict = zdict[-cls._MAX_ZDICT_LENGTH : ]
+		index = [ ]
+		names = set()
+		tmp_filename = filename + ".tmp"
+		try:
+			with open(tmp_filename, "wb") as f:
+				f.write(bytes(cls._HEADER.size))
+				for (name, bp_string) in members:
+					try:
+						if name in names:
+							raise ValueError("Duplicate member name.")
+						(mode, level, mem_level, gzip_header, gzip_crc, hash_value, prefix, data, suffix) = cls._encode_member(bp_string)
+					except (ValueError, zlib.error) as e:
+						if error_callback is None:
+							raise ValueError("%s: %s" % (name, str(e))) from e
+						error_callback(name, e)
+						continue
+					names.add(name)
+					compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, zlib.Z_DEFAULT_STRATEGY, zdict) if (len(zdict) > 0) else zlib.compressobj(9, zlib.DEFLATED, 15, 9)
+					blob = cls._BLOB_HEADER.pack({ "prefix_length": len(prefix), "suffix_length": len(suffix) }) + prefix + suffix + data
+					compressed = compressor.compress(blob) + compressor.flush()
+					index.append(cls.Member(name = name, hash_value = hash_value, offset = f.tell(), length = len(compressed), mode = mode, level = level, mem_level = mem_level, gzip_header = gzip_header, gzip_crc = gzip_crc)._asdict())
+					f.write(compressed)
+
+				zdict_offset = f.tell()
+				f.write(zdict)
+				index_offset = f.tell()
+				index_data = zlib.compress(json.dumps(index).encode("utf-8"), 9)
+				f.write(index_data)
+
+				f.seek(0)
+				f.write(cls._HEADER.pack({
+					"magic": cls._MAGIC,
+					"version": cls._VERSION,
+					"member_count": len(index),
+					"zdict_offset": zdict_offset,
+					"zdict_length": len(zdict),
+					"index_offset": index_offset,
+					"index_length": len(index_data),
+				}))
+			os.replace(tmp_filename, filename)
+		finally:
+			if os.path.exists(tmp_filename):
+				os.unlink(tmp_filename)
+		return len(index)
+
+	def _decode_member(self, member, compressed):
+		decompressor = zlib.decompressobj(15, self._zdict) if (len(self._zdict) > 0) else zlib.decompressobj(15)
+		blob = decompressor.decompress(compressed) + decompressor.flush()
+		blob_header = self._BLOB_HEADER.unpack_head(blob)
+		offset = self._BLOB_HEADER.size
+		prefix = blob[offset : offset + blob_header.prefix_length].decode("utf-8")
+		offset += blob_header.prefix_length
+		suffix = blob[offset : offset + blob_header.suffix_length].decode("utf-8")
+		offset += blob_header.suffix_length
+		data = blob[offset : ]
+
+		if member.mode == "text":
+			return data.decode("utf-8")
+		elif member.mode == "payload":
+			compressor = zlib.compressobj(member.level, zlib.DEFLATED, -15, member.mem_level)
+			trailer = zlib.crc32(data).to_bytes(4, byteorder = "little") + (len(data) & 0xffffffff).to_bytes(4, byteorder = "little")
+			gzip_data = bytes.fromhex(member.gzip_header) + compressor.compress(data) + compressor.flush() + trailer
+			# The payload is only stored if this zlib recreated the original
+			# stream when packing; a different zlib may not.
+			if member.gzip_crc is not None:
+				if zlib.crc32(gzip_data) != member.gzip_crc:
+					raise InvalidArchiveException("Member %s cannot be restored bit-exactly with this zlib version." % (member.name))
+			else:
+				bp_string = prefix + base64.b64encode(gzip_data).decode("ascii") + suffix
+				if Blueprint.validate_hashes([ bp_string ])[0] is False:
+					raise InvalidArchiveException("Member %s cannot be restored bit-exactly with this zlib version." % (member.name))
+				return bp_string
+		else:
+			gzip_data = data
+		return prefix + base64.b64encode(gzip_data).decode("ascii") + suffix
+
+	def _read_member(self, member):
+		self._f.seek(member.offset)
+		return self._decode_member(member, self._f.read(member.length))
+
+	def get(self, name):
+		return self._read_member(self._by_name[name])
+
+	def member_by_hash(self, hash_value):
+		return self._by_hash[hash_value.lower()]
+
+	def get_by_hash(self, hash_value):
+		return self._read_member(self.member_by_hash(hash_value))
+
+	def __iter__(self):
+		# Members are stored back to back, so a full scan is one sequential
+		# read of the archive.
+		for member in sorted(self._members, key = lambda member: member.offset):
+			yield (member.name, self._read_member(member))
+
+	def close(self):
+		self._f.close()
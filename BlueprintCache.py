@@ -0,0 +1,82 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import collections
+import threading
+from Blueprint import Blueprint
+
+class BlueprintCache():
+	# LRU cache of parsed blueprint files, keyed by path, mtime and size.
+	# Callers always receive a copy of the cached Blueprint, so header
+	# edits do not leak into the cache; the payload and its decoded
+	# BlueprintData are shared between copies.
+	_Entry = collections.namedtuple("Entry", [ "blueprint", "hash_validated" ])
+
+	def __init__(self, max_entries = 64):
+		self._max_entries = max_entries
+		self._entries = collections.OrderedDict()
+		self._lock = threading.Lock()
+		self._hits = 0
+		self._misses = 0
+
+	@property
+	def hits(self):
+		return self._hits
+
+	@property
+	def misses(self):
+		return self._misses
+
+	def __len__(self):
+		return len(self._entries)
+
+	def read(self, filename, validate_hash = True):
+		stat = os.stat(filename)
+		key = (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+		with self._lock:
+			entry = self._entries.get(key)
+			if (entry is not None) and (entry.hash_validated or (not validate_hash)):
+				self._entries.move_to_end(key)
+				self._hits += 1
+				return entry.blueprint.copy()
+
+		with open(filename) as f:
+			blueprint = Blueprint.from_blueprint_string(f.read(), validate_hash = validate_hash)
+		with self._lock:
+			self._misses += 1
+			self._entries[key] = self._Entry(blueprint = blueprint, hash_validated = validate_hash)
+			self._entries.move_to_end(key)
+			while len(self._entries) > self._max_entries:
+				self._entries.popitem(last = False)
+		return blueprint.copy()
+
+	def record_hits(self, count):
+		# Accounts for hits on a copy of this cache (in a forked process)
+		with self._lock:
+			self._hits += count
+
+	def filenames(self):
+		with self._lock:
+			return [ filename for (filename, mtime_ns, size) in self._entries ]
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
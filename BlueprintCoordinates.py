@@ -0,0 +1,115 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+
+import operator
+import itertools
+import collections
+
+class BlueprintCoordinates():
+	# Converts area-local building positions to planet coordinates. The
+	# planet grid model used here:
+	#   - A planet has 1000 grid columns around the equator (200 longitude
+	#     segments of 5 grid units each) and 250 grid rows from the equator
+	#     to either pole.
+	#   - Within an area, local_offset_y counts grid rows from the area's
+	#     tropic_anchor row, so the absolute row is tropic_anchor + y.
+	#   - local_offset_x counts grid columns of the area's latitude band,
+	#     which has area_segments longitude segments. Columns are scaled to
+	#     equator-equivalent columns (multiplied by 200 / area_segments);
+	#     longitude 0 is the paste cursor.
+	# anchor_local_offset_x/y, width and height only describe the area's
+	# bounding box and are not needed for the conversion.
+	EQUATOR_SEGMENTS = 200
+	GRID_PER_SEGMENT = 5
+	ROWS_PER_HEMISPHERE = 250
+
+	AreaTransform = collections.namedtuple("AreaTransform", [ "area_index", "column_scale", "row_offset", "longitude_scale", "latitude_scale" ])
+
+	def __init__(self, areas, strict = True):
+		# Areas without longitude segments and positions in nonexistent areas
+		# raise ValueError; unless strict is False, in which case their
+		# converted positions are None.
+		self._strict = strict
+		self._transforms = { }
+		for area in areas:
+			if (area.data.area_segments != 0) or strict:
+				self._transforms[area.data.index] = self._area_transform(area)
+
+	@classmethod
+	def from_blueprint_data(cls, blueprint_data, strict = True):
+		return cls(blueprint_data.areas, strict = strict)
+
+	@classmethod
+	def _area_transform(cls, area):
+		segments = area.data.area_segments
+		if segments == 0:
+			raise ValueError("Area %d has no longitude segments." % (area.data.index))
+		return cls.AreaTransform(
+			area_index = area.data.index,
+			column_scale = cls.EQUATOR_SEGMENTS / segments,
+			row_offset = area.data.tropic_anchor,
+			longitude_scale = 360 / (segments * cls.GRID_PER_SEGMENT),
+			latitude_scale = 90 / cls.ROWS_PER_HEMISPHERE,
+		)
+
+	def transform(self, area_index):
+		return self._transforms[area_index]
+
+	@staticmethod
+	def positions(blueprint_data):
+		# Returns the (area_index, local_offset_x, local_offset_y) columns of
+		# all buildings.
+		if len(blueprint_data.buildings) == 0:
+			return ((), (), ())
+		return tuple(zip(*((building.data.area_index, building.data.local_offset_x, building.data.local_offset_y) for building in blueprint_data.buildings)))
+
+	def _apply(self, operation, values, area_indices, fieldname):
+		# Combines every value with one transform parameter of its area,
+		# looked up from the precomputed per-area transforms.
+		unknown = set(area_indices) - set(self._transforms)
+		if (len(unknown) > 0) and self._strict:
+			raise ValueError("Positions refer to nonexistent area(s): %s" % (", ".join(str(area_index) for area_index in sorted(unknown))))
+		parameters = { area_index: getattr(transform, fieldname) for (area_index, transform) in self._transforms.items() }
+		if len(unknown) == 0:
+			if len(set(parameters.values())) == 1:
+				return list(map(operation, values, itertools.repeat(next(iter(parameters.values())))))
+			return list(map(operation, values, map(parameters.__getitem__, area_indices)))
+		return [ None if ((value is None) or (parameter is None)) else operation(value, parameter) for (value, parameter) in zip(values, map(parameters.get, area_indices)) ]
+
+	def to_grid(self, area_indices, xs, ys):
+		# Returns the (columns, rows) lists of absolute planet grid positions
+		# in equator-equivalent columns.
+		columns = self._apply(operator.mul, xs, area_indices, "column_scale")
+		rows = self._apply(operator.add, ys, area_indices, "row_offset")
+		return (columns, rows)
+
+	def to_latitude_longitude(self, area_indices, xs, ys):
+		# Returns the (latitudes, longitudes) lists in degrees.
+		rows = self._apply(operator.add, ys, area_indices, "row_offset")
+		latitudes = self._apply(operator.mul, rows, area_indices, "latitude_scale")
+		longitudes = self._apply(operator.mul, xs, area_indices, "longitude_scale")
+		return (latitudes, longitudes)
+
+	def blueprint_grid(self, blueprint_data):
+		return self.to_grid(*self.positions(blueprint_data))
+
+	def blueprint_latitude_longitude(self, blueprint_data):
+		return self.to_latitude_longitude(*self.positions(blueprint_data))
@@ -18,8 +18,13 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
+import math
+import struct
+import array
 import collections
+import collections.abc
 from NamedStruct import NamedStruct
+from Profiler import Profiler
 from Enums import DysonSphereItem, LogisticsStationDirection
 
 class StationParameters():
@@ -27,6 +32,7 @@ class StationParameters():
 	_STORAGE_OFFSET = 0
 	_SLOTS_OFFSET = _STORAGE_OFFSET + 192
 	_PARAMETERS_OFFSET = _SLOTS_OFFSET + 128
+	MINIMUM_PARAMETER_COUNT = _PARAMETERS_OFFSET + len(_Parameters._fields)
 
 	def __init__(self, parameters, storage_len, slots_len):
 		self._storage = self._parse_storage(parameters, storage_len)
@@ -114,9 +120,20 @@ class BlueprintArea():
 	def size(self):
 		return self._BLUEPRINT_AREA.size
 
+	@property
+	def data(self):
+		return self._fields
+
 	def to_dict(self):
 		return self._fields._asdict()
 
+	@classmethod
+	def from_dict(cls, area_dict):
+		return cls(cls._BLUEPRINT_AREA.create(area_dict))
+
+	def serialize(self):
+		return self._BLUEPRINT_AREA.pack(self._fields._asdict())
+
 	@classmethod
 	def deserialize(cls, data, offset):
 		fields = cls._BLUEPRINT_AREA.unpack_head(data, offset)
@@ -149,6 +166,11 @@ class BlueprintBuilding():
 		("H", "parameter_count"),
 	))
 
+	_PARAMETER_COUNT = _BLUEPRINT_BUILDING.field_struct("parameter_count")
+	_PARAMETER_COUNT_OFFSET = _BLUEPRINT_BUILDING.offsetof("parameter_count")
+	_FLOAT_FIELD_POSITIONS = tuple(position for (position, fieldtype) in enumerate(_BLUEPRINT_BUILDING.fieldtypes) if (fieldtype == "f"))
+	_FLOAT32 = struct.Struct("<f")
+
 	def __init__(self, fields, parameters):
 		self._fields = fields
 		self._parameters = parameters
@@ -189,15 +211,100 @@ class BlueprintBuilding():
 			result["parameters"] = result["parameters"].to_dict()
 		return result
 
+	@classmethod
+	def from_dict(cls, building_dict):
+		building_dict = dict(building_dict)
+		if isinstance(building_dict["item_id"], str):
+			building_dict["item_id"] = DysonSphereItem[building_dict["item_id"]].value
+		parameters = building_dict.pop("parameters")
+		if not isinstance(parameters, list):
+			# StationParameters.to_dict() omits unused storage and slot
+			# entries and several raw values, so it cannot be reversed.
+			raise ValueError("Building %d has decoded station parameters that cannot be converted back; export it with the table format instead." % (building_dict["index"]))
+		return cls(cls._BLUEPRINT_BUILDING.create(building_dict), parameters)
+
+	@classmethod
+	def _compact_float(cls, value):
+		# Shortest decimal representation that is still parsed to the same
+		# single precision value, e.g., 12.345 instead of 12.345000267028809
+		if value.is_integer():
+			return value
+		packed = cls._FLOAT32.pack(value)
+		for digits in range(6, 10):
+			candidate = float("%.*g" % (digits, value))
+			if cls._FLOAT32.pack(candidate) == packed:
+				return candidate
+		return value
+
+	def to_row(self):
+		# Positional representation for the table format; trailing zero
+		# parameters are implied by parameter_count.
+		row = list(self._fields)
+		for position in self._FLOAT_FIELD_POSITIONS:
+			row[position] = self._compact_float(row[position])
+		parameters = self._parameters
+		length = len(parameters)
+		while (length > 0) and (parameters[length - 1] == 0):
+			length -= 1
+		row.append(parameters[ : length])
+		return row
+
+	@classmethod
+	def from_row(cls, row):
+		fields = cls._BLUEPRINT_BUILDING.create(dict(zip(cls._BLUEPRINT_BUILDING.fieldnames, row)))
+		parameters = list(row[len(fields)])
+		if len(parameters) > fields.parameter_count:
+			raise ValueError("Building %d has %d parameters, but a parameter_count of %d." % (fields.index, len(parameters), fields.parameter_count))
+		parameters += [ 0 ] * (fields.parameter_count - len(parameters))
+		return cls(fields, parameters)
+
+	@classmethod
+	def row_fieldnames(cls):
+		return list(cls._BLUEPRINT_BUILDING.fieldnames) + [ "parameters" ]
+
+	def serialize(self):
+		assert(self._fields.parameter_count == len(self._parameters))
+		return self._BLUEPRINT_BUILDING.pack(self._fields._asdict()) + struct.pack("<%dL" % (len(self._parameters)), *self._parameters)
+
 	@classmethod
 	def deserialize(cls, data, offset):
 		fields = cls._BLUEPRINT_BUILDING.unpack_head(data, offset)
 		offset += cls._BLUEPRINT_BUILDING.size
 
-		parameters = [ int.from_bytes(data[offset + 4 * i : offset + (4 * (i + 1)) ], byteorder = "little") for i in range(fields.parameter_count) ]
+		parameters = list(struct.unpack_from("<%dL" % (fields.parameter_count), data, offset))
 		return cls(fields, parameters)
 
+class LazyBuildingList(collections.abc.Sequence):
+	def __init__(self, data, offsets):
+		self._data = data
+		self._offsets = offsets
+
+	@property
+	def offsets(self):
+		return self._offsets
+
+	def __len__(self):
+		return len(self._offsets) - 1
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [ self[i] for i in range(*index.indices(len(self))) ]
+		if index < 0:
+			index += len(self)
+		if (index < 0) or (index >= len(self)):
+			raise IndexError("Building index %d out of range." % (index))
+		return BlueprintBuilding.deserialize(self._data, self._offsets[index])
+
 class BlueprintData():
+	ValidationIssue = collections.namedtuple("ValidationIssue", [ "building", "message" ])
+	_NO_OBJECT = 0xffffffff
+	_NO_AREA = -1
+	# Area indices are signed bytes
+	_MAX_AREAS = 128
+	_MINIMUM_PARAMETER_COUNTS = {
+		DysonSphereItem.PlanetaryLogisticsStation:		StationParameters.MINIMUM_PARAMETER_COUNT,
+		DysonSphereItem.InterstellarLogisticsStation:	StationParameters.MINIMUM_PARAMETER_COUNT,
+	}
 	_HEADER = NamedStruct((
 		("L", "version"),
 		("L", "cursor_offset_x"),
@@ -217,18 +324,277 @@ class BlueprintData():
 		self._areas = areas
 		self._buildings = buildings
 
+	@property
+	def header(self):
+		return self._header
+
+	@property
+	def areas(self):
+		return self._areas
+
 	@property
 	def buildings(self):
 		return self._buildings
 
 	def to_dict(self):
-		result = self._header._asdict()
-		result["areas"] = [ area.to_dict() for area in self._areas ]
-		result["buildings"] = [ building.to_dict() for building in self._buildings ]
+		with Profiler.stage("blueprint_data.to_dict"):
+			result = self._header._asdict()
+			result["areas"] = [ area.to_dict() for area in self._areas ]
+			result["buildings"] = [ building.to_dict() for building in self._buildings ]
+		return result
+
+	def to_table_dict(self):
+		# Like to_dict, but areas and buildings are given as a list of field
+		# names and one positional row per record. Parameters are kept raw,
+		# so that (unlike to_dict) station buildings are represented exactly.
+		with Profiler.stage("blueprint_data.to_table_dict"):
+			result = self._header._asdict()
+			result["areas"] = {
+				"fields": list(BlueprintArea._BLUEPRINT_AREA.fieldnames),
+				"rows": [ list(area.data) for area in self._areas ],
+			}
+			result["buildings"] = {
+				"fields": BlueprintBuilding.row_fieldnames(),
+				"rows": [ building.to_row() for building in self._buildings ],
+			}
 		return result
 
 	@classmethod
-	def deserialize(cls, data):
+	def from_dict(cls, data_dict):
+		# Accepts the output of both to_dict and to_table_dict.
+		with Profiler.stage("blueprint_data.from_dict"):
+			areas = data_dict["areas"]
+			if isinstance(areas, dict):
+				areas = [ dict(zip(areas["fields"], row)) for row in areas["rows"] ]
+			areas = [ BlueprintArea.from_dict(area) for area in areas ]
+
+			buildings = data_dict["buildings"]
+			if isinstance(buildings, dict):
+				rows = buildings["rows"]
+				fieldnames = BlueprintBuilding.row_fieldnames()
+				if buildings["fields"] != fieldnames:
+					# Columns were reordered or are missing
+					missing = set(fieldnames) - set(buildings["fields"])
+					if len(missing) > 0:
+						raise ValueError("Building table lacks field(s): %s" % (", ".join(sorted(missing))))
+					positions = [ buildings["fields"].index(fieldname) for fieldname in fieldnames ]
+					rows = ([ row[position] for position in positions ] for row in rows)
+				buildings = [ BlueprintBuilding.from_row(row) for row in rows ]
+			else:
+				buildings = [ BlueprintBuilding.from_dict(building) for building in buildings ]
+
+			header = cls._HEADER.create({ fieldname: len(areas) if (fieldname == "area_count") else data_dict[fieldname] for fieldname in cls._HEADER.fieldnames })
+		return cls(header, areas, buildings)
+
+	def serialize(self):
+		with Profiler.stage("blueprint_data.serialize") as stage:
+			header = self._header._replace(area_count = len(self._areas))
+			result = bytearray(self._HEADER.pack(header._asdict()))
+			for area in self._areas:
+				result += area.serialize()
+			result += self._BUILDING_HEADER.pack({ "building_count": len(self._buildings) })
+			for building in self._buildings:
+				result += building.serialize()
+			stage.bytes_out = len(result)
+		return bytes(result)
+
+	@classmethod
+	def _renumber_buildings(cls, buildings, first_index = 0, area_map = None):
+		# Assign consecutive indices starting at first_index and rewrite the
+		# connections accordingly; connections to buildings that are not
+		# part of the given list are cut. area_map optionally maps old to new
+		# area indices.
+		index_map = { building.data.index: new_index for (new_index, building) in enumerate(buildings, first_index) }
+		no_object = cls._NO_OBJECT
+		renumbered = [ ]
+		for building in buildings:
+			fields = building.data
+			fields = fields._replace(
+				index = index_map[fields.index],
+				area_index = fields.area_index if (area_map is None) else area_map.get(fields.area_index, fields.area_index),
+				output_object_index = index_map.get(fields.output_object_index, no_object),
+				input_object_index = index_map.get(fields.input_object_index, no_object),
+			)
+			renumbered.append(BlueprintBuilding(fields, building.raw_parameters))
+		return renumbered
+
+	@classmethod
+	def merge(cls, blueprint_datas):
+		blueprint_datas = list(blueprint_datas)
+		if len(blueprint_datas) == 0:
+			raise ValueError("Need at least one blueprint to merge.")
+
+		# Areas of the inputs that lie on the same latitude band with the same
+		# parent chain become one area of the merged blueprint; its extent
+		# covers all of them.
+		areas = [ ]
+		merged_by_key = { }
+		buildings = [ ]
+		for bpd in blueprint_datas:
+			by_index = { area.data.index: area.data for area in bpd.areas }
+			keys = { }
+			def area_key(index, visiting = ()):
+				if index not in keys:
+					fields = by_index[index]
+					if (fields.parent_index == cls._NO_AREA) or (fields.parent_index not in by_index) or (fields.parent_index in visiting):
+						parent_key = None
+					else:
+						parent_key = area_key(fields.parent_index, visiting + (index, ))
+					keys[index] = (fields.tropic_anchor, fields.area_segments, parent_key)
+				return keys[index]
+
+			def depth(key):
+				return 0 if (key is None) else (1 + depth(key[2]))
+
+			# Parents are merged before their children
+			area_map = { }
+			for area in sorted(bpd.areas, key = lambda area: depth(area_key(area.data.index))):
+				fields = area.data
+				key = area_key(fields.index)
+				if key in merged_by_key:
+					merged_index = merged_by_key[key]
+					merged = areas[merged_index]
+					areas[merged_index] = merged._replace(width = max(merged.width, fields.width), height = max(merged.height, fields.height))
+				else:
+					merged_index = len(areas)
+					merged_by_key[key] = merged_index
+					parent_index = cls._NO_AREA if (key[2] is None) else merged_by_key[key[2]]
+					areas.append(fields._replace(index = merged_index, parent_index = parent_index))
+				area_map[fields.index] = merged_index
+			if len(areas) > cls._MAX_AREAS:
+				raise ValueError("The merged blueprint would need more than %d areas." % (cls._MAX_AREAS))
+			buildings += cls._renumber_buildings(bpd.buildings, first_index = len(buildings), area_map = area_map)
+
+		areas = [ BlueprintArea(fields) for fields in areas ]
+		header = blueprint_datas[0].header._replace(area_count = len(areas))
+		return cls(header, areas, buildings)
+
+	def _validate_areas(self):
+		issues = [ ]
+		if self._header.area_count != len(self._areas):
+			issues.append(self.ValidationIssue(None, "area_count is %d, but %d areas are present" % (self._header.area_count, len(self._areas))))
+		if not (0 <= self._header.primary_area_index < len(self._areas)):
+			issues.append(self.ValidationIssue(None, "primary_area_index %d does not exist" % (self._header.primary_area_index)))
+		for (position, area) in enumerate(self._areas):
+			if area.data.index != position:
+				issues.append(self.ValidationIssue(None, "area %d has index %d" % (position, area.data.index)))
+			if (area.data.parent_index != self._NO_AREA) and not (0 <= area.data.parent_index < len(self._areas)):
+				issues.append(self.ValidationIssue(None, "area %d has nonexistent parent_index %d" % (position, area.data.parent_index)))
+		return issues
+
+	def validate(self):
+		# Checks the structural invariants of the blueprint and returns all
+		# violations at once, ordered by building position (issues that
+		# concern the blueprint as a whole come first). Checks are done per
+		# field column with set lookups, not per building.
+		issues = self._validate_areas()
+		fieldnames = BlueprintBuilding._BLUEPRINT_BUILDING.fieldnames
+		records = [ building.data for building in self._buildings ]
+		if len(records) == 0:
+			return issues
+		columns = dict(zip(fieldnames, zip(*records)))
+
+		index_counts = collections.Counter(columns["index"])
+		duplicates = set(index for (index, count) in index_counts.items() if (count > 1))
+		if len(duplicates) > 0:
+			for (position, index) in enumerate(columns["index"]):
+				if index in duplicates:
+					issues.append(self.ValidationIssue(position, "duplicate index %d" % (index)))
+
+		valid_targets = set(index_counts)
+		valid_targets.add(self._NO_OBJECT)
+		for fieldname in ("output_object_index", "input_object_index"):
+			column = columns[fieldname]
+			if valid_targets.issuperset(column):
+				continue
+			for (position, target) in enumerate(column):
+				if target not in valid_targets:
+					issues.append(self.ValidationIssue(position, "%s %d does not exist" % (fieldname, target)))
+
+		area_indices = set(range(len(self._areas)))
+		if not area_indices.issuperset(columns["area_index"]):
+			for (position, area_index) in enumerate(columns["area_index"]):
+				if area_index not in area_indices:
+					issues.append(self.ValidationIssue(position, "area_index %d does not exist" % (area_index)))
+
+		known_items = set(item.value for item in DysonSphereItem)
+		if not known_items.issuperset(columns["item_id"]):
+			for (position, item_id) in enumerate(columns["item_id"]):
+				if item_id not in known_items:
+					issues.append(self.ValidationIssue(position, "unknown item_id %d" % (item_id)))
+
+		for (item, minimum) in self._MINIMUM_PARAMETER_COUNTS.items():
+			for (position, (item_id, parameter_count)) in enumerate(zip(columns["item_id"], columns["parameter_count"])):
+				if (item_id == item) and (parameter_count < minimum):
+					issues.append(self.ValidationIssue(position, "%s has only %d parameters, needs at least %d" % (item.name, parameter_count, minimum)))
+
+		parameter_lengths = [ len(building.raw_parameters) for building in self._buildings ]
+		if columns["parameter_count"] != tuple(parameter_lengths):
+			for (position, (parameter_count, parameter_length)) in enumerate(zip(columns["parameter_count"], parameter_lengths)):
+				if parameter_count != parameter_length:
+					issues.append(self.ValidationIssue(position, "parameter_count is %d, but %d parameters are present" % (parameter_count, parameter_length)))
+
+		for (position, fieldname) in enumerate(fieldnames):
+			if BlueprintBuilding._BLUEPRINT_BUILDING.fieldtypes[position] != "f":
+				continue
+			column = columns[fieldname]
+			if not all(map(math.isfinite, column)):
+				for (building_position, value) in enumerate(column):
+					if not math.isfinite(value):
+						issues.append(self.ValidationIssue(building_position, "%s is %s" % (fieldname, value)))
+
+		issues.sort(key = lambda issue: -1 if (issue.building is None) else issue.building)
+		return issues
+
+	def reorder(self, key):
+		# Sort the buildings by the given key function and renumber them, so
+		# that index again equals the position of every building.
+		return self.__class__(self._header, self._areas, self._renumber_buildings(sorted(self._buildings, key = key)))
+
+	def subset(self, positions):
+		return self.__class__(self._header, self._areas, self._renumber_buildings([ self._buildings[position] for position in positions ]))
+
+	def split(self, tile_size = None, max_buildings = None):
+		# Partition the buildings into square tiles of tile_size grid units
+		# (by local_offset_x/y) and optionally limit every part to at most
+		# max_buildings buildings. Tiles are emitted row by row. Connections
+		# that cross part boundaries are cut.
+		if (tile_size is None) and (max_buildings is None):
+			raise ValueError("Either tile_size or max_buildings must be given.")
+		if tile_size is None:
+			tile_size = 32
+
+		tiles = collections.defaultdict(list)
+		for building in self._buildings:
+			key = (math.floor(building.data.local_offset_y / tile_size), math.floor(building.data.local_offset_x / tile_size))
+			tiles[key].append(building)
+
+		parts = [ ]
+		current = [ ]
+		for key in sorted(tiles):
+			tile = tiles[key]
+			if max_buildings is None:
+				parts.append(tile)
+				continue
+			for start in range(0, len(tile), max_buildings):
+				chunk = tile[start : start + max_buildings]
+				if len(current) + len(chunk) > max_buildings:
+					parts.append(current)
+					current = [ ]
+				current += chunk
+		if len(current) > 0:
+			parts.append(current)
+
+		return [ self.__class__(self._header, self._areas, self._renumber_buildings(part)) for part in parts ]
+
+	def transform(self, translate = None, rotate = None, center = (0, 0), mirror = None):
+		from BuildingTable import BuildingTable
+		table = BuildingTable(self.serialize())
+		table.transform(translate = translate, rotate = rotate, center = center, mirror = mirror)
+		return self.deserialize(table.data)
+
+	@classmethod
+	def _deserialize_areas(cls, data):
 		header = cls._HEADER.unpack_head(data)
 
 		areas = [ ]
@@ -237,13 +603,49 @@ class BlueprintData():
 			area = BlueprintArea.deserialize(data, offset)
 			offset += area.size
 			areas.append(area)
+		return (header, areas, offset)
 
-		buildings = [ ]
+	@classmethod
+	def _scan_building_offsets(cls, data, offset):
+		# Only look at the parameter_count of every record to find the
+		# beginning of the next one; the last entry marks the end of the
+		# building records.
 		building_header = cls._BUILDING_HEADER.unpack_head(data, offset)
 		offset += cls._BUILDING_HEADER.size
+
+		unpack_parameter_count = BlueprintBuilding._PARAMETER_COUNT.unpack_from
+		parameter_count_offset = BlueprintBuilding._PARAMETER_COUNT_OFFSET
+		fixed_size = BlueprintBuilding._BLUEPRINT_BUILDING.size
+		offsets = array.array("Q", bytes(8 * (building_header.building_count + 1)))
 		for building_id in range(building_header.building_count):
-			building = BlueprintBuilding.deserialize(data, offset)
-			offset += building.size
-			buildings.append(building)
+			offsets[building_id] = offset
+			(parameter_count, ) = unpack_parameter_count(data, offset + parameter_count_offset)
+			offset += fixed_size + (4 * parameter_count)
+		offsets[building_header.building_count] = offset
+		if offset > len(data):
+			raise ValueError("Building records exceed blueprint data (need %d bytes, have %d)." % (offset, len(data)))
+		return offsets
 
-		return cls(header, areas, buildings)
+	@classmethod
+	def building_offsets(cls, data):
+		(header, areas, offset) = cls._deserialize_areas(data)
+		return cls._scan_building_offsets(data, offset)
+
+	@classmethod
+	def deserialize(cls, data, lazy = False):
+		with Profiler.stage("blueprint_data.deserialize", bytes_in = len(data)):
+			(header, areas, offset) = cls._deserialize_areas(data)
+
+			if lazy:
+				offsets = cls._scan_building_offsets(data, offset)
+				return cls(header, areas, LazyBuildingList(data, offsets))
+
+			buildings = [ ]
+			building_header = cls._BUILDING_HEADER.unpack_head(data, offset)
+			offset += cls._BUILDING_HEADER.size
+			for building_id in range(building_header.building_count):
+				building = BlueprintBuilding.deserialize(data, offset)
+				offset += building.size
+				buildings.append(building)
+
+			return cls(header, areas, buildings)
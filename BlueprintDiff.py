@@ -0,0 +1,114 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import collections
+
+class BlueprintDiff():
+	Modification = collections.namedtuple("Modification", [ "old", "new", "changes" ])
+	_NO_OBJECT = 0xffffffff
+	_INDEX_FIELDS = set([ "index", "output_object_index", "input_object_index" ])
+	_POSITION_DIGITS = 3
+
+	def __init__(self, old_data, new_data):
+		self._added = [ ]
+		self._removed = [ ]
+		self._modified = [ ]
+		self._compare(old_data.buildings, new_data.buildings)
+
+	@property
+	def added(self):
+		return self._added
+
+	@property
+	def removed(self):
+		return self._removed
+
+	@property
+	def modified(self):
+		return self._modified
+
+	@property
+	def identical(self):
+		return (len(self._added) == 0) and (len(self._removed) == 0) and (len(self._modified) == 0)
+
+	@classmethod
+	def _position_key(cls, building):
+		fields = building.data
+		return (fields.area_index, round(fields.local_offset_x, cls._POSITION_DIGITS), round(fields.local_offset_y, cls._POSITION_DIGITS), round(fields.local_offset_z, cls._POSITION_DIGITS))
+
+	@classmethod
+	def _content_keys(cls, buildings):
+		# Building indices differ between blueprints, so connections are
+		# resolved to the position of the connected building (not its item,
+		# so that replacing a building does not affect its neighbours).
+		positions = { building.data.index: cls._position_key(building) for building in buildings }
+		keys = [ ]
+		for building in buildings:
+			fields = building.data
+			key = tuple(value for (name, value) in zip(fields._fields, fields) if name not in cls._INDEX_FIELDS)
+			key += (positions.get(fields.output_object_index), positions.get(fields.input_object_index), tuple(building.raw_parameters))
+			keys.append(key)
+		return keys
+
+	@classmethod
+	def _changes(cls, old, old_key, new, new_key):
+		changes = { }
+		for (name, old_value, new_value) in zip(old.data._fields, old.data, new.data):
+			if (name not in cls._INDEX_FIELDS) and (old_value != new_value):
+				changes[name] = (old_value, new_value)
+		if old.raw_parameters != new.raw_parameters:
+			changes["parameters"] = (old.raw_parameters, new.raw_parameters)
+		if old_key[-3 : -1] != new_key[-3 : -1]:
+			changes["connections"] = (old_key[-3 : -1], new_key[-3 : -1])
+		return changes
+
+	def _compare(self, old_buildings, new_buildings):
+		# Pass 1: exact content matches, hashed through a multimap.
+		unmatched_old = collections.defaultdict(list)
+		for (key, building) in zip(self._content_keys(old_buildings), old_buildings):
+			unmatched_old[key].append((key, building))
+
+		unmatched_new = [ ]
+		for (key, building) in zip(self._content_keys(new_buildings), new_buildings):
+			candidates = unmatched_old.get(key)
+			if candidates:
+				candidates.pop()
+			else:
+				unmatched_new.append((key, building))
+
+		# Pass 2: remaining buildings at the same position are considered
+		# modifications of each other.
+		by_position = collections.defaultdict(list)
+		for candidates in unmatched_old.values():
+			for (key, building) in candidates:
+				by_position[self._position_key(building)].append((key, building))
+
+		for (key, building) in unmatched_new:
+			candidates = by_position.get(self._position_key(building))
+			if candidates:
+				(old_key, old) = candidates.pop()
+				self._modified.append(self.Modification(old = old, new = building, changes = self._changes(old, old_key, building, key)))
+			else:
+				self._added.append(building)
+
+		for candidates in by_position.values():
+			self._removed += [ building for (key, building) in candidates ]
+		self._removed.sort(key = lambda building: building.data.index)
+		self._modified.sort(key = lambda modification: modification.new.data.index)
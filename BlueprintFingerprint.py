@@ -0,0 +1,130 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import struct
+import hashlib
+import collections
+from Blueprint import Blueprint
+from BlueprintData import BlueprintData
+from BuildingTable import BuildingTable
+
+def _minhash_coefficients(count, prime):
+	coefficients = [ ]
+	for i in range(count):
+		seed = hashlib.blake2b(b"dspbptk minhash %d" % (i), digest_size = 16).digest()
+		a = (int.from_bytes(seed[:8], byteorder = "little") % (prime - 1)) + 1
+		b = int.from_bytes(seed[8:], byteorder = "little") % prime
+		coefficients.append((a, b))
+	return coefficients
+
+class BlueprintFingerprint():
+	_PRIME = (1 << 61) - 1
+	_MINHASH_PERMUTATIONS = 64
+	_LSH_ROWS_PER_BAND = 4
+	_LAYOUT_CELL_SIZE = 2
+	_TOKEN = struct.Struct("<Bllq")
+	_COEFFICIENTS = _minhash_coefficients(_MINHASH_PERMUTATIONS, _PRIME)
+
+	def __init__(self, content_hash, minhash):
+		self._content_hash = content_hash
+		self._minhash = tuple(minhash)
+
+	@property
+	def content_hash(self):
+		return self._content_hash
+
+	@property
+	def minhash(self):
+		return self._minhash
+
+	def similarity(self, other):
+		return sum(1 for (a, b) in zip(self._minhash, other.minhash) if a == b) / len(self._minhash)
+
+	def lsh_bands(self):
+		rows = self._LSH_ROWS_PER_BAND
+		for band_no in range(len(self._minhash) // rows):
+			yield (band_no, self._minhash[band_no * rows : (band_no + 1) * rows])
+
+	@classmethod
+	def _normalize_positions(cls, table):
+		# Move the blueprint so that its lower left corner is at the origin
+		# and quantize positions so that float32 rounding of the original
+		# offsets does not change the hash.
+		for (x_field, y_field, z_field, yaw_field) in table._POSITION_FIELDS:
+			for fieldname in (x_field, y_field):
+				values = table.column(fieldname)
+				if len(values) == 0:
+					continue
+				minimum = min(values)
+				table.set_column(fieldname, [ round(value - minimum, 2) for value in values ])
+
+	@classmethod
+	def _token_hash(cls, tag, a, b, c = 0):
+		return int.from_bytes(hashlib.blake2b(cls._TOKEN.pack(tag, a, b, c), digest_size = 8).digest(), byteorder = "little")
+
+	@classmethod
+	def _tokens(cls, table):
+		item_ids = table.column("item_id")
+		xs = table.column("local_offset_x")
+		ys = table.column("local_offset_y")
+		tokens = set()
+
+		# Item histogram, on a logarithmic scale
+		for (item_id, count) in collections.Counter(item_ids).items():
+			for magnitude in range(count.bit_length()):
+				tokens.add(cls._token_hash(0, item_id, magnitude))
+
+		# Relative layout, quantized to coarse cells
+		if len(xs) > 0:
+			(min_x, min_y) = (min(xs), min(ys))
+			cell_size = cls._LAYOUT_CELL_SIZE
+			for (item_id, x, y) in zip(item_ids, xs, ys):
+				tokens.add(cls._token_hash(1, item_id, round((x - min_x) / cell_size), round((y - min_y) / cell_size)))
+		return tokens
+
+	@classmethod
+	def _compute_minhash(cls, tokens):
+		if len(tokens) == 0:
+			return [ 0 ] * cls._MINHASH_PERMUTATIONS
+		prime = cls._PRIME
+		return [ min(((a * token) + b) % prime for token in tokens) for (a, b) in cls._COEFFICIENTS ]
+
+	@classmethod
+	def from_raw_data(cls, data, normalize_positions = False):
+		table = BuildingTable(data)
+		if normalize_positions:
+			cls._normalize_positions(table)
+		content_hash = hashlib.sha256(table.data[BlueprintData._HEADER.size : ]).hexdigest()
+		return cls(content_hash = content_hash, minhash = cls._compute_minhash(cls._tokens(table)))
+
+	@classmethod
+	def from_file(cls, filename, normalize_positions = False, validate_hash = True):
+		bp = Blueprint.read_from_file(filename, validate_hash = validate_hash)
+		return cls.from_raw_data(bp.raw_data, normalize_positions = normalize_positions)
+
+	def to_dict(self):
+		return {
+			"content_hash": self._content_hash,
+			"minhash": list(self._minhash),
+		}
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(content_hash = data["content_hash"], minhash = data["minhash"])
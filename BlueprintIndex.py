@@ -0,0 +1,127 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import sqlite3
+import collections
+from Blueprint import Blueprint
+from BuildingTable import BuildingTable
+
+class BlueprintIndex():
+	UpdateResult = collections.namedtuple("UpdateResult", [ "unchanged", "touched", "indexed", "removed", "failed" ])
+	Condition = collections.namedtuple("Condition", [ "item_id", "operator", "count" ])
+	_OPERATORS = set([ "<", "<=", "=", "!=", ">", ">=" ])
+
+	def __init__(self, dbfile):
+		self._db = sqlite3.connect(dbfile)
+		self._cursor = self._db.cursor()
+		self._cursor.execute("PRAGMA foreign_keys = ON;")
+		self._cursor.execute("""CREATE TABLE IF NOT EXISTS blueprints (
+			id integer PRIMARY KEY,
+			filename varchar NOT NULL UNIQUE,
+			mtime_ns integer NOT NULL,
+			size integer NOT NULL,
+			hash varchar NOT NULL,
+			short_desc varchar NOT NULL,
+			long_desc varchar NOT NULL,
+			game_version varchar NOT NULL,
+			timestamp varchar NOT NULL,
+			building_count integer NOT NULL
+		);""")
+		self._cursor.execute("""CREATE TABLE IF NOT EXISTS items (
+			blueprint_id integer NOT NULL REFERENCES blueprints(id) ON DELETE CASCADE,
+			item_id integer NOT NULL,
+			count integer NOT NULL,
+			PRIMARY KEY(blueprint_id, item_id)
+		);""")
+		self._cursor.execute("CREATE INDEX IF NOT EXISTS items_item_count ON items(item_id, count);")
+		self._db.commit()
+
+	@staticmethod
+	def _hash_value(bp_string):
+		return bp_string[bp_string.rindex("\"") + 1 : ].strip().lower()
+
+	def _insert(self, filename, stat, bp_string, validate_hash):
+		try:
+			bp = Blueprint.from_blueprint_string(bp_string, validate_hash = validate_hash)
+		except AssertionError as e:
+			# Stream files with several blueprints (or anything else that is
+			# not a blueprint) fail the format assertions of the decoder
+			raise ValueError("Not a single blueprint string.") from e
+		item_counts = collections.Counter(BuildingTable(bp.raw_data).column("item_id"))
+		self._cursor.execute("DELETE FROM blueprints WHERE filename = ?;", (filename, ))
+		self._cursor.execute("INSERT INTO blueprints (filename, mtime_ns, size, hash, short_desc, long_desc, game_version, timestamp, building_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);", (
+			filename, stat.st_mtime_ns, stat.st_size, self._hash_value(bp_string), bp.short_desc, bp.long_desc, bp.game_version, bp.timestamp.strftime("%Y-%m-%d %H:%M:%S"), sum(item_counts.values())))
+		blueprint_id = self._cursor.lastrowid
+		self._cursor.executemany("INSERT INTO items (blueprint_id, item_id, count) VALUES (?, ?, ?);", [ (blueprint_id, item_id, count) for (item_id, count) in item_counts.items() ])
+
+	def update(self, filenames, validate_hash = True, error_callback = None):
+		known = { filename: (mtime_ns, size, hash_value) for (filename, mtime_ns, size, hash_value) in self._cursor.execute("SELECT filename, mtime_ns, size, hash FROM blueprints;").fetchall() }
+		(unchanged, touched, indexed, failed) = (0, 0, 0, 0)
+		for filename in filenames:
+			filename = os.path.abspath(filename)
+			entry = known.get(filename)
+			try:
+				stat = os.stat(filename)
+				if (entry is not None) and (entry[0] == stat.st_mtime_ns) and (entry[1] == stat.st_size):
+					unchanged += 1
+					continue
+
+				with open(filename) as f:
+					bp_string = f.read()
+				if (entry is not None) and (entry[2] == self._hash_value(bp_string)):
+					# File was touched, but the blueprint did not change
+					self._cursor.execute("UPDATE blueprints SET mtime_ns = ?, size = ? WHERE filename = ?;", (stat.st_mtime_ns, stat.st_size, filename))
+					touched += 1
+				else:
+					self._insert(filename, stat, bp_string, validate_hash)
+					indexed += 1
+			except Exception as e:
+				failed += 1
+				if error_callback is not None:
+					error_callback(filename, e)
+
+		removed = 0
+		for filename in known:
+			if not os.path.exists(filename):
+				self._cursor.execute("DELETE FROM blueprints WHERE filename = ?;", (filename, ))
+				removed += 1
+		self._db.commit()
+		return self.UpdateResult(unchanged = unchanged, touched = touched, indexed = indexed, removed = removed, failed = failed)
+
+	def search(self, conditions, text = None):
+		where = [ ]
+		parameters = [ ]
+		for condition in conditions:
+			if condition.operator not in self._OPERATORS:
+				raise ValueError("Unsupported operator: %s" % (condition.operator))
+			where.append("(COALESCE((SELECT count FROM items WHERE (items.blueprint_id = blueprints.id) AND (items.item_id = ?)), 0) %s ?)" % (condition.operator))
+			parameters += [ condition.item_id, condition.count ]
+		if text is not None:
+			where.append("((short_desc LIKE ?) OR (long_desc LIKE ?))")
+			parameters += [ "%" + text + "%", "%" + text + "%" ]
+		query = "SELECT filename, short_desc, building_count FROM blueprints"
+		if len(where) > 0:
+			query += " WHERE " + " AND ".join(where)
+		query += " ORDER BY filename ASC;"
+		return self._cursor.execute(query, parameters).fetchall()
+
+	def close(self):
+		self._db.close()
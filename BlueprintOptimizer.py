@@ -0,0 +1,92 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+
+import collections
+from Blueprint import Blueprint
+
+class BlueprintOptimizer():
+	# Reorders building records so that similar records end up next to each
+	# other, which gives deflate more (and closer) repetitions to work with.
+	# References between buildings are rewritten, so the blueprint remains
+	# functionally identical.
+	Result = collections.namedtuple("Result", [ "strategy", "data", "compressed_size" ])
+	_NO_OBJECT = 0xffffffff
+	STRATEGIES = ( "item", "position", "parameters", "connections" )
+
+	def __init__(self, blueprint_data):
+		self._data = blueprint_data
+
+	@staticmethod
+	def _position_key(building):
+		fields = building.data
+		return (fields.area_index, fields.local_offset_y, fields.local_offset_x, fields.local_offset_z)
+
+	@classmethod
+	def _item_key(cls, building):
+		fields = building.data
+		return (fields.item_id, fields.model_index, fields.recipe_id, fields.filter_id) + cls._position_key(building)
+
+	@classmethod
+	def _parameters_key(cls, building):
+		return (building.data.parameter_count, tuple(building.raw_parameters)) + cls._item_key(building)
+
+	def _connection_order(self):
+		# Follow the output connections (e.g., along belts) so that buildings
+		# of one chain are stored consecutively. Chains start at buildings
+		# that no other building outputs to, in item order.
+		buildings = sorted(self._data.buildings, key = self._item_key)
+		by_index = { building.data.index: building for building in buildings }
+		targets = set(building.data.output_object_index for building in buildings)
+		heads = [ building for building in buildings if building.data.index not in targets ]
+
+		positions = { }
+		for building in heads + buildings:
+			while (building is not None) and (building.data.index not in positions):
+				positions[building.data.index] = len(positions)
+				building = by_index.get(building.data.output_object_index) if (building.data.output_object_index != self._NO_OBJECT) else None
+		return lambda building: positions[building.data.index]
+
+	def _key(self, strategy):
+		if strategy == "item":
+			return self._item_key
+		elif strategy == "position":
+			return self._position_key
+		elif strategy == "parameters":
+			return self._parameters_key
+		elif strategy == "connections":
+			return self._connection_order()
+		raise ValueError("Unknown reordering strategy: %s" % (strategy))
+
+	def reorder(self, strategy):
+		data = self._data.reorder(self._key(strategy)).serialize()
+		return self.Result(strategy = strategy, data = data, compressed_size = Blueprint.compressed_size(data))
+
+	def original(self):
+		data = self._data.serialize()
+		return self.Result(strategy = "original", data = data, compressed_size = Blueprint.compressed_size(data))
+
+	def optimize(self, strategies = None):
+		# Returns all results, smallest first. The unmodified record order
+		# always takes part, so the best result is never worse than that.
+		strategies = strategies or self.STRATEGIES
+		results = [ self.original() ] + [ self.reorder(strategy) for strategy in strategies ]
+		results.sort(key = lambda result: result.compressed_size)
+		return results
@@ -0,0 +1,118 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+
+import collections.abc
+from BlueprintData import BlueprintData, BlueprintBuilding
+
+class BlueprintOverlay(collections.abc.Sequence):
+	# Editable view of a BlueprintData that never modifies (or copies) the
+	# base: changed buildings are kept in a sparse map from building
+	# position to the replacement record, everything else is read from the
+	# base. Overlays derived from one another share the base and its
+	# serialized form, so many variants of one blueprint cost memory only
+	# for their edits. Buildings can be changed, but not added or removed.
+	def __init__(self, base, _base_payload = None, _deltas = None):
+		self._base = base
+		self._base_payload = _base_payload
+		self._deltas = { } if (_deltas is None) else _deltas
+
+	@classmethod
+	def from_raw_data(cls, data):
+		base = BlueprintData.deserialize(data, lazy = True)
+		return cls(base, _base_payload = (data, base.buildings.offsets))
+
+	@property
+	def base(self):
+		return self._base
+
+	@property
+	def edited_positions(self):
+		return sorted(self._deltas)
+
+	def __len__(self):
+		return len(self._base.buildings)
+
+	def __getitem__(self, position):
+		if isinstance(position, slice):
+			return [ self[i] for i in range(*position.indices(len(self))) ]
+		if position < 0:
+			position += len(self)
+		if position in self._deltas:
+			return self._deltas[position]
+		return self._base.buildings[position]
+
+	def derive(self):
+		# Returns a new overlay with the same edits, to be modified further
+		# independently of this one.
+		return self.__class__(self._base, _base_payload = self._payload(), _deltas = dict(self._deltas))
+
+	def _set(self, position, building):
+		if position < 0:
+			position += len(self)
+		base_building = self._base.buildings[position]
+		if (building.data == base_building.data) and (building.raw_parameters == base_building.raw_parameters):
+			self._deltas.pop(position, None)
+		else:
+			self._deltas[position] = building
+
+	def update(self, position, **fields):
+		building = self[position]
+		self._set(position, BlueprintBuilding(building.data._replace(**fields), building.raw_parameters))
+
+	def set_parameters(self, position, parameters):
+		building = self[position]
+		parameters = list(parameters)
+		self._set(position, BlueprintBuilding(building.data._replace(parameter_count = len(parameters)), parameters))
+
+	def replace(self, fieldname, mapping):
+		# Substitutes field values of all buildings like BuildingTable.replace
+		# and returns the number of values that were changed.
+		changed = 0
+		for (position, building) in enumerate(self):
+			value = getattr(building.data, fieldname)
+			new_value = mapping.get(value, value)
+			if new_value != value:
+				self.update(position, **{ fieldname: new_value })
+				changed += 1
+		return changed
+
+	def _payload(self):
+		if self._base_payload is None:
+			data = self._base.serialize()
+			self._base_payload = (data, BlueprintData.building_offsets(data))
+		return self._base_payload
+
+	def serialize(self):
+		# Unchanged runs of building records are copied from the serialized
+		# base as a whole, only edited records are packed.
+		(data, offsets) = self._payload()
+		view = memoryview(data)
+		parts = [ ]
+		copied_up_to = 0
+		for position in sorted(self._deltas):
+			parts.append(view[copied_up_to : offsets[position]])
+			parts.append(self._deltas[position].serialize())
+			copied_up_to = offsets[position + 1]
+		parts.append(view[copied_up_to : ])
+		return b"".join(parts)
+
+	def to_blueprint_data(self):
+		return BlueprintData(self._base.header, self._base.areas, list(self))
@@ -0,0 +1,122 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+
+import zlib
+import struct
+import collections
+from Enums import DysonSphereItem
+from BlueprintCoordinates import BlueprintCoordinates
+
+class BlueprintRenderer():
+	# Top-down preview of a blueprint: every building is drawn as a filled
+	# square at its planet grid position (so that buildings of all areas end
+	# up in the right place), coloured by the category of its item.
+	# Larger buildings are drawn later, so they end up on top of belts.
+	Category = collections.namedtuple("Category", [ "name", "first_item_id", "last_item_id", "colour", "footprint" ])
+	_CATEGORIES = (
+		Category(name = "sorter", first_item_id = 2011, last_item_id = 2013, colour = (90, 170, 230), footprint = 1),
+		Category(name = "belt", first_item_id = 2001, last_item_id = 2020, colour = (150, 150, 150), footprint = 1),
+		Category(name = "logistics", first_item_id = 2103, last_item_id = 2105, colour = (70, 110, 240), footprint = 8),
+		Category(name = "storage", first_item_id = 2101, last_item_id = 2106, colour = (160, 110, 60), footprint = 3),
+		Category(name = "power", first_item_id = 2201, last_item_id = 2212, colour = (240, 210, 60), footprint = 2),
+		Category(name = "production", first_item_id = 2301, last_item_id = 2399, colour = (230, 120, 40), footprint = 3),
+		Category(name = "research", first_item_id = 2901, last_item_id = 2901, colour = (170, 80, 220), footprint = 3),
+	)
+	_OTHER = Category(name = "other", first_item_id = None, last_item_id = None, colour = (220, 220, 220), footprint = 1)
+	_BACKGROUND = (24, 24, 28)
+
+	def __init__(self, size = 128):
+		self._size = size
+		self._skipped_buildings = 0
+		self._categories = self._item_categories()
+
+	@classmethod
+	def _item_categories(cls):
+		categories = { }
+		for item in DysonSphereItem:
+			categories[item.value] = next((category for category in cls._CATEGORIES if (category.first_item_id <= item.value <= category.last_item_id)), cls._OTHER)
+		return categories
+
+	@property
+	def skipped_buildings(self):
+		# Buildings of the last rendered blueprint that could not be placed
+		# because their area does not exist or is invalid
+		return self._skipped_buildings
+
+	def _category(self, item_id):
+		return self._categories.get(item_id, self._OTHER)
+
+	def render(self, blueprint_data):
+		# Returns (width, height, RGB pixel data). The longer side of the
+		# blueprint's bounding box is scaled to the configured size.
+		(xs, ys) = BlueprintCoordinates.from_blueprint_data(blueprint_data, strict = False).blueprint_grid(blueprint_data)
+		placed = [ position for (position, x) in enumerate(xs) if (x is not None) ]
+		self._skipped_buildings = len(xs) - len(placed)
+		if self._skipped_buildings > 0:
+			xs = [ xs[position] for position in placed ]
+			ys = [ ys[position] for position in placed ]
+		buildings = [ blueprint_data.buildings[position] for position in placed ]
+		if len(xs) == 0:
+			return (1, 1, bytes(self._BACKGROUND))
+
+		(min_x, max_x, min_y, max_y) = (min(xs), max(xs), min(ys), max(ys))
+		extent = max(max_x - min_x, max_y - min_y, 1)
+		scale = (self._size - 1) / extent
+		width = round((max_x - min_x) * scale) + 1
+		height = round((max_y - min_y) * scale) + 1
+
+		# Bin all positions to pixel coordinates at once (north is up)
+		columns = [ round((x - min_x) * scale) for x in xs ]
+		rows = [ round((max_y - y) * scale) for y in ys ]
+		categories = [ self._category(building.data.item_id) for building in buildings ]
+
+		pixels = bytearray(bytes(self._BACKGROUND) * (width * height))
+		order = sorted(range(len(categories)), key = lambda position: categories[position].footprint)
+		for position in order:
+			category = categories[position]
+			half = max(0, round(category.footprint * scale) // 2)
+			colour = bytes(category.colour)
+			first_column = max(0, columns[position] - half)
+			last_column = min(width - 1, columns[position] + half)
+			span = colour * (last_column - first_column + 1)
+			for row in range(max(0, rows[position] - half), min(height - 1, rows[position] + half) + 1):
+				offset = 3 * ((row * width) + first_column)
+				pixels[offset : offset + len(span)] = span
+		return (width, height, bytes(pixels))
+
+	@staticmethod
+	def _png_chunk(chunk_type, data):
+		return struct.pack(">L", len(data)) + chunk_type + data + struct.pack(">L", zlib.crc32(chunk_type + data))
+
+	@classmethod
+	def encode_png(cls, width, height, pixels):
+		# 8 bit RGB, every scanline with filter type 0 (none)
+		stride = 3 * width
+		raw = b"".join(b"\x00" + pixels[row * stride : (row + 1) * stride] for row in range(height))
+		return b"".join([
+			b"\x89PNG\r\n\x1a\n",
+			cls._png_chunk(b"IHDR", struct.pack(">LLBBBBB", width, height, 8, 2, 0, 0, 0)),
+			cls._png_chunk(b"IDAT", zlib.compress(raw, 9)),
+			cls._png_chunk(b"IEND", b""),
+		])
+
+	def to_png(self, blueprint_data):
+		return self.encode_png(*self.render(blueprint_data))
@@ -0,0 +1,217 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import json
+import hmac
+import signal
+import socket
+import ipaddress
+
+class BlueprintServer():
+	# Line-based JSON protocol. Every request is an object of the form
+	#   { "argv": [ "dump", "foo.txt" ], "cwd": "/home/user" }
+	# and is answered by
+	#   { "returncode": 0, "stdout": "...", "stderr": "..." }
+	# A request of { "op": "stats" } returns the cache statistics instead.
+	# If the server has a token, every request needs to carry it as "token".
+	# Commands are executed one after another by a single worker thread,
+	# because their output is captured by redirecting stdout/stderr. A
+	# request from a directory other than the server's own is executed in
+	# a forked child that changes to that directory, so the server process
+	# never changes its working directory.
+	_NOT_FORWARDED = set([ "serve" ])
+
+	def __init__(self, multicommand, address, cache_size = 64, allow_remote = False, token = None):
+		self._mc = multicommand
+		self._address = self.parse_address(address)
+		self._cache_size = cache_size
+		self._token = token
+		self._cache = None
+		self._executor = None
+		if self._address[0] == "tcp":
+			if allow_remote:
+				if token is None:
+					raise ValueError("Listening on a remote address requires a token.")
+			elif not self._is_loopback(self._address[1]):
+				raise ValueError("Refusing to listen on non-loopback address %s without --allow-remote." % (self._address[1]))
+
+	@staticmethod
+	def parse_address(address):
+		if address.startswith("unix:"):
+			return ("unix", address[5:])
+		elif ("/" not in address) and (":" in address):
+			(host, port) = address.rsplit(":", maxsplit = 1)
+			return ("tcp", host, int(port))
+		return ("unix", address)
+
+	@staticmethod
+	def _is_loopback(host):
+		try:
+			addresses = socket.getaddrinfo(host, None, proto = socket.IPPROTO_TCP)
+		except OSError:
+			return False
+		return (len(addresses) > 0) and all(ipaddress.ip_address(sockaddr[0].split("%")[0]).is_loopback for (family, socktype, proto, canonname, sockaddr) in addresses)
+
+	@classmethod
+	def _connect(cls, address):
+		address = cls.parse_address(address)
+		if address[0] == "unix":
+			sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			sock.connect(address[1])
+		else:
+			sock = socket.create_connection(address[1:])
+		return sock
+
+	@classmethod
+	def request(cls, address, request):
+		with cls._connect(address) as sock:
+			sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+			response = bytearray()
+			while not response.endswith(b"\n"):
+				data = sock.recv(65536)
+				if len(data) == 0:
+					raise ConnectionError("Server closed connection before responding.")
+				response += data
+		return json.loads(response)
+
+	@classmethod
+	def forward(cls, address, argv, token = None):
+		# Returns None if no server is reachable so that the caller can fall
+		# back to running the command itself.
+		request = { "argv": argv, "cwd": os.getcwd() }
+		if token is not None:
+			request["token"] = token
+		try:
+			return cls.request(address, request)
+		except (OSError, ValueError):
+			return None
+
+	def _execute_in_child(self, argv, cwd):
+		# Runs the command in a forked child in the given directory. The
+		# child reports back the files it added to its copy of the cache,
+		# so that the server can cache them as well.
+		cached_before = set(self._cache.filenames())
+		hits_before = self._cache.hits
+		(read_fd, write_fd) = os.pipe()
+		pid = os.fork()
+		if pid == 0:
+			try:
+				os.close(read_fd)
+				try:
+					os.chdir(cwd)
+					result = self._mc.execute(argv)._asdict()
+				except OSError as e:
+					result = { "returncode": 1, "stdout": "", "stderr": "Cannot change to directory %s: %s\n" % (cwd, str(e)) }
+				result["cached"] = [ filename for filename in self._cache.filenames() if (filename not in cached_before) ]
+				result["cache_hits"] = self._cache.hits - hits_before
+				with os.fdopen(write_fd, "wb") as f:
+					f.write(json.dumps(result).encode("utf-8"))
+			finally:
+				os._exit(0)
+
+		os.close(write_fd)
+		with os.fdopen(read_fd, "rb") as f:
+			data = f.read()
+		os.waitpid(pid, 0)
+		if len(data) == 0:
+			return { "returncode": 1, "stdout": "", "stderr": "Command terminated unexpectedly.\n" }
+		result = json.loads(data)
+		self._cache.record_hits(result.pop("cache_hits"))
+		for filename in result.pop("cached"):
+			try:
+				self._cache.read(filename)
+			except Exception:
+				pass
+		return result
+
+	def _execute(self, request):
+		if (self._token is not None) and (not hmac.compare_digest(str(request.get("token", "")).encode("utf-8"), self._token.encode("utf-8"))):
+			return { "returncode": 1, "stdout": "", "stderr": "Invalid or missing server token.\n" }
+
+		if request.get("op") == "stats":
+			return { "entries": len(self._cache), "hits": self._cache.hits, "misses": self._cache.misses }
+
+		argv = request.get("argv")
+		if (not isinstance(argv, list)) or (len(argv) == 0) or (not all(isinstance(arg, str) for arg in argv)):
+			return { "returncode": 1, "stdout": "", "stderr": "Request needs a non-empty argv list.\n" }
+		if self._mc.resolve(argv[0]) in self._NOT_FORWARDED:
+			return { "returncode": 1, "stdout": "", "stderr": "Command cannot be run through the server: %s\n" % (argv[0]) }
+
+		cwd = request.get("cwd")
+		if (cwd is not None) and (os.path.realpath(str(cwd)) != os.getcwd()):
+			return self._execute_in_child(argv, str(cwd))
+		return self._mc.execute(argv)._asdict()
+
+	async def _handle_client(self, reader, writer):
+		import asyncio
+		loop = asyncio.get_running_loop()
+		try:
+			while True:
+				line = await reader.readline()
+				if len(line) == 0:
+					break
+				try:
+					request = json.loads(line)
+				except ValueError as e:
+					response = { "returncode": 1, "stdout": "", "stderr": "Invalid request: %s\n" % (str(e)) }
+				else:
+					response = await loop.run_in_executor(self._executor, self._execute, request)
+				writer.write(json.dumps(response).encode("utf-8") + b"\n")
+				await writer.drain()
+		finally:
+			writer.close()
+
+	async def _serve(self):
+		import asyncio
+		if self._address[0] == "unix":
+			if os.path.exists(self._address[1]):
+				os.unlink(self._address[1])
+			# Only the user running the server may connect
+			umask = os.umask(0o177)
+			try:
+				server = await asyncio.start_unix_server(self._handle_client, path = self._address[1])
+			finally:
+				os.umask(umask)
+			os.chmod(self._address[1], 0o600)
+		else:
+			server = await asyncio.start_server(self._handle_client, host = self._address[1], port = self._address[2])
+		loop = asyncio.get_running_loop()
+		stopped = loop.create_future()
+		loop.add_signal_handler(signal.SIGTERM, stopped.set_result, None)
+		async with server:
+			await stopped
+
+	def run(self):
+		import asyncio
+		import concurrent.futures
+		from Blueprint import Blueprint
+		from BlueprintCache import BlueprintCache
+
+		self._cache = BlueprintCache(max_entries = self._cache_size)
+		Blueprint.set_file_cache(self._cache)
+		self._executor = concurrent.futures.ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "dspbptk-server")
+		try:
+			asyncio.run(self._serve())
+		finally:
+			Blueprint.set_file_cache(None)
+			self._executor.shutdown()
+			if (self._address[0] == "unix") and os.path.exists(self._address[1]):
+				os.unlink(self._address[1])
@@ -0,0 +1,159 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import ast
+import operator
+import itertools
+from Enums import DysonSphereItem
+from BuildingTable import BuildingTable
+
+class InvalidQueryException(Exception): pass
+
+class BuildingQuery():
+	# Filter expressions over the fixed building fields, e.g.
+	#   item == SorterMKIII and recipe_id != 0 and local_offset_x > 100
+	# Every comparison is evaluated for a whole column at once (through
+	# map() over the column lists) and yields a list of booleans; these
+	# masks are then combined by the boolean operators.
+	_ALIASES = {
+		"item":		"item_id",
+		"model":	"model_index",
+		"recipe":	"recipe_id",
+		"filter":	"filter_id",
+		"x":		"local_offset_x",
+		"y":		"local_offset_y",
+		"z":		"local_offset_z",
+	}
+	_COMPARISONS = {
+		ast.Eq:		operator.eq,
+		ast.NotEq:	operator.ne,
+		ast.Lt:		operator.lt,
+		ast.LtE:	operator.le,
+		ast.Gt:		operator.gt,
+		ast.GtE:	operator.ge,
+	}
+	_FIELDNAMES = set(BuildingTable._BLUEPRINT_BUILDING.fieldnames)
+
+	def __init__(self, expression):
+		self._expression = expression
+		try:
+			tree = ast.parse(expression, mode = "eval")
+		except SyntaxError as e:
+			raise InvalidQueryException("Cannot parse query \"%s\": %s" % (expression, e.msg))
+		self._predicate = self._compile_predicate(tree.body)
+
+	@property
+	def expression(self):
+		return self._expression
+
+	@classmethod
+	def resolve_fieldname(cls, name):
+		fieldname = cls._ALIASES.get(name, name)
+		if fieldname not in cls._FIELDNAMES:
+			raise InvalidQueryException("No such building field: %s" % (name))
+		return fieldname
+
+	def _compile_value(self, node):
+		# Returns (is_column, value); columns are resolved later against a
+		# BuildingTable, constants are Python values.
+		if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+			return (False, node.value)
+		elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+			(is_column, value) = self._compile_value(node.operand)
+			if is_column:
+				raise InvalidQueryException("Cannot negate a building field.")
+			return (False, -value)
+		elif isinstance(node, ast.Name):
+			fieldname = self._ALIASES.get(node.id, node.id)
+			if fieldname in self._FIELDNAMES:
+				return (True, fieldname)
+			try:
+				return (False, DysonSphereItem[node.id].value)
+			except KeyError:
+				raise InvalidQueryException("Unknown field or item name: %s" % (node.id))
+		elif isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+			values = [ self._compile_value(element) for element in node.elts ]
+			if any(is_column for (is_column, value) in values):
+				raise InvalidQueryException("Sets may only contain constants.")
+			return (False, frozenset(value for (is_column, value) in values))
+		raise InvalidQueryException("Unsupported expression: %s" % (ast.unparse(node)))
+
+	@staticmethod
+	def _operand(columns, is_column, value):
+		if is_column:
+			return columns(value)
+		return itertools.repeat(value)
+
+	def _compile_comparison(self, op, left, right):
+		(left_is_column, left_value) = left
+		(right_is_column, right_value) = right
+		if (not left_is_column) and (not right_is_column):
+			raise InvalidQueryException("Comparison needs at least one building field.")
+
+		if isinstance(op, (ast.In, ast.NotIn)):
+			if right_is_column or (not isinstance(right_value, frozenset)):
+				raise InvalidQueryException("Right hand side of 'in' must be a set of constants.")
+			contains = right_value.__contains__
+			if isinstance(op, ast.In):
+				return lambda columns: list(map(contains, columns(left_value)))
+			else:
+				return lambda columns: [ not value for value in map(contains, columns(left_value)) ]
+
+		comparison = self._COMPARISONS.get(type(op))
+		if comparison is None:
+			raise InvalidQueryException("Unsupported comparison operator: %s" % (op.__class__.__name__))
+		return lambda columns: list(map(comparison, self._operand(columns, left_is_column, left_value), self._operand(columns, right_is_column, right_value)))
+
+	def _compile_predicate(self, node):
+		if isinstance(node, ast.BoolOp):
+			operands = [ self._compile_predicate(value) for value in node.values ]
+			combine = operator.and_ if isinstance(node.op, ast.And) else operator.or_
+			def evaluate(columns):
+				mask = operands[0](columns)
+				for operand in operands[1:]:
+					mask = list(map(combine, mask, operand(columns)))
+				return mask
+			return evaluate
+		elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+			operand = self._compile_predicate(node.operand)
+			return lambda columns: list(map(operator.not_, operand(columns)))
+		elif isinstance(node, ast.Compare):
+			values = [ self._compile_value(node.left) ] + [ self._compile_value(comparator) for comparator in node.comparators ]
+			comparisons = [ self._compile_comparison(op, left, right) for (op, left, right) in zip(node.ops, values, values[1:]) ]
+			if len(comparisons) == 1:
+				return comparisons[0]
+			def evaluate(columns):
+				mask = comparisons[0](columns)
+				for comparison in comparisons[1:]:
+					mask = list(map(operator.and_, mask, comparison(columns)))
+				return mask
+			return evaluate
+		raise InvalidQueryException("Unsupported expression: %s" % (ast.unparse(node)))
+
+	def evaluate(self, table):
+		cache = { }
+		def columns(fieldname):
+			if fieldname not in cache:
+				cache[fieldname] = table.column(fieldname)
+			return cache[fieldname]
+		return self._predicate(columns)
+
+	def select(self, table):
+		return list(itertools.compress(range(len(table)), self.evaluate(table)))
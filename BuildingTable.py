@@ -0,0 +1,141 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import math
+from BlueprintData import BlueprintData, BlueprintBuilding
+
+class BuildingTable():
+	# Column-wise access to the fixed building fields of a decompressed
+	# blueprint payload. Values are read from and written to the raw bytes
+	# directly, no BlueprintBuilding objects are ever created.
+	_BLUEPRINT_BUILDING = BlueprintBuilding._BLUEPRINT_BUILDING
+	_POSITION_FIELDS = (
+		("local_offset_x", "local_offset_y", "local_offset_z", "yaw"),
+		("local_offset_x2", "local_offset_y2", "local_offset_z2", "yaw2"),
+	)
+
+	def __init__(self, data):
+		self._data = bytearray(data)
+		self._offsets = BlueprintData.building_offsets(self._data)
+
+	@property
+	def data(self):
+		return bytes(self._data)
+
+	@property
+	def offsets(self):
+		return self._offsets
+
+	@property
+	def fieldnames(self):
+		return self._BLUEPRINT_BUILDING.fieldnames
+
+	def __len__(self):
+		return len(self._offsets) - 1
+
+	def _field(self, fieldname):
+		if fieldname not in self.fieldnames:
+			raise KeyError("No such building field: %s" % (fieldname))
+		return (self._BLUEPRINT_BUILDING.offsetof(fieldname), self._BLUEPRINT_BUILDING.field_struct(fieldname))
+
+	def column(self, fieldname):
+		(field_offset, field_struct) = self._field(fieldname)
+		unpack_from = field_struct.unpack_from
+		data = self._data
+		return [ unpack_from(data, offset + field_offset)[0] for offset in self._offsets[:-1] ]
+
+	def set_column(self, fieldname, values):
+		if len(values) != len(self):
+			raise ValueError("Column %s needs %d values, %d given." % (fieldname, len(self), len(values)))
+		(field_offset, field_struct) = self._field(fieldname)
+		pack_into = field_struct.pack_into
+		data = self._data
+		for (offset, value) in zip(self._offsets, values):
+			pack_into(data, offset + field_offset, value)
+
+	def replace(self, substitutions):
+		# substitutions maps a field name to a { old_value: new_value }
+		# dictionary. Returns the number of field values that were changed.
+		changed = 0
+		data = self._data
+		offsets = self._offsets[:-1]
+		for (fieldname, mapping) in substitutions.items():
+			if len(mapping) == 0:
+				continue
+			(field_offset, field_struct) = self._field(fieldname)
+			unpack_from = field_struct.unpack_from
+			pack_into = field_struct.pack_into
+			for offset in offsets:
+				(value, ) = unpack_from(data, offset + field_offset)
+				new_value = mapping.get(value)
+				if (new_value is not None) and (new_value != value):
+					pack_into(data, offset + field_offset, new_value)
+					changed += 1
+		return changed
+
+	@staticmethod
+	def _rotation(angle):
+		# Exact values for multiples of 90 degrees so that grid-aligned
+		# buildings stay exactly on the grid.
+		if (angle % 90) == 0:
+			quadrant = round(angle / 90) % 4
+			return ((1, 0), (0, 1), (-1, 0), (0, -1))[quadrant]
+		radians = math.radians(angle)
+		return (math.cos(radians), math.sin(radians))
+
+	def transform(self, translate = None, rotate = None, center = (0, 0), mirror = None):
+		# Applied in the order mirror, rotate, translate. Rotation is
+		# clockwise in degrees around center (i.e., in the same sense as the
+		# building yaw), mirror is either "x" (negate x coordinates) or "y"
+		# (negate y coordinates).
+		if mirror not in (None, "x", "y"):
+			raise ValueError("Mirror axis must be 'x' or 'y'.")
+		for (x_field, y_field, z_field, yaw_field) in self._POSITION_FIELDS:
+			xs = self.column(x_field)
+			ys = self.column(y_field)
+			yaws = self.column(yaw_field)
+
+			if mirror == "x":
+				xs = [ -x for x in xs ]
+				yaws = [ (360 - yaw) % 360 for yaw in yaws ]
+			elif mirror == "y":
+				ys = [ -y for y in ys ]
+				yaws = [ (540 - yaw) % 360 for yaw in yaws ]
+
+			if (rotate is not None) and ((rotate % 360) != 0):
+				(cos, sin) = self._rotation(rotate)
+				(cx, cy) = center
+				dxs = [ x - cx for x in xs ]
+				dys = [ y - cy for y in ys ]
+				xs = [ cx + (dx * cos) + (dy * sin) for (dx, dy) in zip(dxs, dys) ]
+				ys = [ cy - (dx * sin) + (dy * cos) for (dx, dy) in zip(dxs, dys) ]
+				yaws = [ (yaw + rotate) % 360 for yaw in yaws ]
+
+			if translate is not None:
+				(tx, ty) = translate[:2]
+				xs = [ x + tx for x in xs ]
+				ys = [ y + ty for y in ys ]
+				if len(translate) > 2:
+					tz = translate[2]
+					self.set_column(z_field, [ z + tz for z in self.column(z_field) ])
+
+			self.set_column(x_field, xs)
+			self.set_column(y_field, ys)
+			self.set_column(yaw_field, yaws)
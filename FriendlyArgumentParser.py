@@ -31,10 +31,24 @@ class FriendlyArgumentParser(argparse.ArgumentParser):
 	def __init__(self, *args, **kwargs):
 		argparse.ArgumentParser.__init__(self, *args, **kwargs)
 		self.__silent_error = False
+		self.__validators = [ ]
 
 	def setsilenterror(self, silenterror):
 		self.__silent_error = silenterror
 
+	def add_validator(self, validator):
+		# The validator is called with the parsed arguments and returns an
+		# error message for invalid combinations of arguments (or None).
+		self.__validators.append(validator)
+
+	def parse_args(self, *args, **kwargs):
+		result = argparse.ArgumentParser.parse_args(self, *args, **kwargs)
+		for validator in self.__validators:
+			msg = validator(result)
+			if msg is not None:
+				self.error(msg)
+		return result
+
 	def error(self, msg):
 		if self.__silent_error:
 			raise Exception(msg)
@@ -187,10 +187,10 @@ class DysonSphereMD5():
 		if count_length:
 			self._length += len(data)
 		self._buffer += data
-		while len(self._buffer) >= 64:
-			block = self._buffer[:64]
-			self._buffer = self._buffer[64:]
-			self._update_block(block)
+		block_count = len(self._buffer) // 64
+		for offset in range(0, 64 * block_count, 64):
+			self._update_block(self._buffer[offset : offset + 64])
+		del self._buffer[: 64 * block_count]
 		return self
 
 	def update(self, data):
@@ -263,6 +263,106 @@ class DysonSphereMD5():
 			[ABCD  4  6 61]  [DABC 11 10 62]  [CDAB  2 15 63]  [BCDA  9 21 64]
 		""")
 
+class MultiBufferMD5():
+	# Hashes many independent messages in lockstep. The state words of all
+	# messages ("lanes") are packed into one Python integer per state word,
+	# every lane occupying a 64 bit slot, so that each step of the
+	# compression function is a single big integer operation for all lanes.
+	# The upper 32 bits of each slot absorb the carries of additions and the
+	# bits shifted out by rotations and are masked off after every round.
+	# Lanes are sorted by their (padded) block count, longest first; lanes
+	# that have consumed all their blocks are dropped from the top end.
+	_LANE_BITS = 64
+
+	def __init__(self, variant = DysonSphereMD5.Variant.Original):
+		patches = DysonSphereMD5._ROUND_OP_PATCHES.get(variant, { })
+		self._round_ops = [ patches.get(i, round_op) for (i, round_op) in enumerate(DysonSphereMD5._ROUND_OPS) ]
+		self._init_values = DysonSphereMD5._INIT_VALUES[variant]
+		self._variant = variant
+
+	@staticmethod
+	def _pad(message):
+		padding_len = (64 - (len(message) % 64) - 8) % 64
+		if padding_len == 0:
+			padding_len = 64
+		return bytes(message) + b"\x80" + bytes(padding_len - 1) + int.to_bytes((len(message) * 8) & 0xffffffffffffffff, length = 8, byteorder = "little")
+
+	@classmethod
+	def _spread(cls, lane_count, value):
+		# Integer with the same 32 bit value in every lane.
+		return int.from_bytes(int.to_bytes(value, length = 4, byteorder = "little").ljust(cls._LANE_BITS // 8, b"\x00") * lane_count, byteorder = "little")
+
+	@classmethod
+	def _message_words(cls, blocks, lane_count):
+		# blocks contains the current 64 byte block of every lane, back to
+		# back. Returns the 16 message words, each packed for all lanes.
+		lane_bytes = cls._LANE_BITS // 8
+		words = [ ]
+		packed = bytearray(lane_bytes * lane_count)
+		for k in range(16):
+			for byte in range(4):
+				packed[byte :: lane_bytes] = blocks[4 * k + byte :: 64]
+			words.append(int.from_bytes(packed, byteorder = "little"))
+		return words
+
+	def _compress(self, state, constants, blocks, lane_count):
+		# constants are the lane-packed mask and round constants
+		(mask, round_constants) = constants
+		x = self._message_words(blocks, lane_count)
+		regs = list(state)
+		for (round_op, constant) in zip(self._round_ops, round_constants):
+			ra = regs[round_op.a]
+			rb = regs[round_op.b]
+			rc = regs[round_op.c]
+			rd = regs[round_op.d]
+			if round_op.op is DysonSphereMD5._f:
+				f = rd ^ (rb & (rc ^ rd))
+			elif round_op.op is DysonSphereMD5._g:
+				f = rc ^ (rd & (rb ^ rc))
+			elif round_op.op is DysonSphereMD5._h:
+				f = rb ^ rc ^ rd
+			else:
+				f = rc ^ (rb | (rd ^ mask))
+			value = (ra + f + x[round_op.k] + constant) & mask
+			regs[round_op.a] = (rb + (((value << round_op.s) | (value >> (32 - round_op.s))) & mask)) & mask
+		return tuple((old + new) & mask for (old, new) in zip(state, regs))
+
+	def digests(self, messages):
+		if len(messages) == 1:
+			# Nothing to run in lockstep with
+			return [ DysonSphereMD5(variant = self._variant).update(messages[0]).digest() ]
+		padded = [ self._pad(message) for message in messages ]
+		order = sorted(range(len(padded)), key = lambda lane: len(padded[lane]), reverse = True)
+		padded = [ padded[lane] for lane in order ]
+		results = [ None ] * len(padded)
+
+		lane_count = len(padded)
+		state = tuple(self._spread(lane_count, value) for value in self._init_values)
+		ones = self._spread(lane_count, 1)
+		constants = (0xffffffff * ones, [ round_op.T * ones for round_op in self._round_ops ])
+		offset = 0
+		while lane_count > 0:
+			blocks = b"".join(message[offset : offset + 64] for message in padded[:lane_count])
+			state = self._compress(state, constants, blocks, lane_count)
+			offset += 64
+
+			# Collect and drop the lanes that are finished
+			active = lane_count
+			while (active > 0) and (len(padded[active - 1]) <= offset):
+				active -= 1
+			if active < lane_count:
+				for lane in range(active, lane_count):
+					shift = lane * self._LANE_BITS
+					results[order[lane]] = b"".join(int.to_bytes((value >> shift) & 0xffffffff, length = 4, byteorder = "little") for value in state)
+				keep = (1 << (active * self._LANE_BITS)) - 1
+				state = tuple(value & keep for value in state)
+				constants = (constants[0] & keep, [ constant & keep for constant in constants[1] ])
+				lane_count = active
+		return results
+
+	def hexdigests(self, messages):
+		return [ digest.hex() for digest in self.digests(messages) ]
+
 if __name__ == "__main__":
 	import os
 	import hashlib
@@ -281,6 +381,10 @@ if __name__ == "__main__":
 		assert(DysonSphereMD5(variant = DysonSphereMD5.Variant.MD5F).update(b"a").hexdigest() == "f10bddaecb62e5a92433757867ee06db")
 		assert(DysonSphereMD5(variant = DysonSphereMD5.Variant.MD5F).update(b"abcd").hexdigest() == "fa27c78b6ec31559f0e760ce3f2b03f6")
 		assert(DysonSphereMD5(variant = DysonSphereMD5.Variant.MD5F).update(b"Why are you doing this, Youthcat Studio?").hexdigest() == "13424e12890a3f50a1f8567c464fff8c")
+		messages = [ os.urandom(length) for length in list(range(200)) + [ 1000, 5000, 64, 64, 0 ] ]
+		for variant in DysonSphereMD5.Variant:
+			expected = [ DysonSphereMD5(variant = variant).update(message).digest() for message in messages ]
+			assert(MultiBufferMD5(variant = variant).digests(messages) == expected)
 		print("Passed testcases.")
 	else:
 		md = DysonSphereMD5(variant = DysonSphereMD5.Variant.MD5F)
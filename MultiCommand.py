@@ -23,9 +23,12 @@
 #
 #	File UUID 4c6b89d0-ec0c-4b19-80d1-4daba7d80967
 
+import io
 import sys
+import importlib
 import collections
 import textwrap
+import contextlib
 
 from FriendlyArgumentParser import FriendlyArgumentParser
 from PrefixMatcher import PrefixMatcher
@@ -33,14 +36,19 @@ from PrefixMatcher import PrefixMatcher
 class MultiCommand():
 	RegisteredCommand = collections.namedtuple("RegisteredCommand", [ "name", "description", "parsergenerator", "action", "aliases", "visible" ])
 	ParseResult = collections.namedtuple("ParseResults", [ "cmd", "args" ])
+	ExecutionResult = collections.namedtuple("ExecutionResult", [ "returncode", "stdout", "stderr" ])
 
 	def __init__(self, trailing_text = None):
 		self._commands = { }
 		self._aliases = { }
 		self._cmdorder = [ ]
 		self._trailing_text = trailing_text
+		self._prefix_matcher = None
 
 	def register(self, commandname, description, parsergenerator, **kwargs):
+		# The action can either be a callable or, to defer importing it until
+		# the command is actually run, a string "module" (the action is then
+		# the attribute of the same name in that module) or "module:attribute".
 		supported_kwargs = set(("aliases", "action", "visible"))
 		if len(set(kwargs.keys()) - supported_kwargs) > 0:
 			raise Exception("Unsupported kwarg found. Supported: %s" % (", ".join(sorted(list(supported_kwargs)))))
@@ -58,6 +66,7 @@ class MultiCommand():
 		cmd = self.RegisteredCommand(commandname, description, parsergenerator, action, aliases, visible = kwargs.get("visible", True))
 		self._commands[commandname] = cmd
 		self._cmdorder.append(commandname)
+		self._prefix_matcher = None
 
 	def _show_syntax(self, msg = None):
 		if msg is not None:
@@ -91,16 +100,37 @@ class MultiCommand():
 	def _getcmdnames(self):
 		return set(self._commands.keys()) | set(self._aliases.keys())
 
+	def _get_prefix_matcher(self):
+		if self._prefix_matcher is None:
+			self._prefix_matcher = PrefixMatcher(self._getcmdnames())
+		return self._prefix_matcher
+
+	@staticmethod
+	def _load_action(action):
+		if not isinstance(action, str):
+			return action
+		(modulename, separator, attributename) = action.partition(":")
+		module = importlib.import_module(modulename)
+		return getattr(module, attributename if separator else modulename.split(".")[-1])
+
+	def resolve(self, commandname):
+		pm = self._get_prefix_matcher()
+		try:
+			commandname = pm.matchunique(commandname)
+		except Exception:
+			return None
+		return self._aliases.get(commandname, commandname)
+
 	def parse(self, cmdline, silent = False):
 		if len(cmdline) < 1:
-			self._raise_error("No command supplied.")
+			self._raise_error("No command supplied.", silent = silent)
 
 		# Check if we can match the command portion
-		pm = PrefixMatcher(self._getcmdnames())
+		pm = self._get_prefix_matcher()
 		try:
 			supplied_cmd = pm.matchunique(cmdline[0])
 		except Exception as e:
-			self._raise_error("Invalid command supplied: %s" % (str(e)))
+			self._raise_error("Invalid command supplied: %s" % (str(e)), silent = silent)
 
 		if supplied_cmd in self._aliases:
 			supplied_cmd = self._aliases[supplied_cmd]
@@ -117,7 +147,37 @@ class MultiCommand():
 		parseresult = self.parse(cmdline, silent)
 		if parseresult.cmd.action is None:
 			raise Exception("Should run command '%s', but no action was registered." % (parseresult.cmd.name))
-		parseresult.cmd.action(parseresult.cmd.name, parseresult.args)
+		action = self._load_action(parseresult.cmd.action)
+		return action(parseresult.cmd.name, parseresult.args)
+
+	@staticmethod
+	def _capture_stream():
+		# Text stream that also has a .buffer for binary output
+		return io.TextIOWrapper(io.BytesIO(), encoding = "utf-8", newline = "", write_through = True)
+
+	@staticmethod
+	def _captured_text(stream):
+		# Binary output that is not UTF-8 is kept as surrogate escapes, so
+		# that it can be restored with .encode("utf-8", "surrogateescape").
+		stream.flush()
+		return stream.buffer.getvalue().decode("utf-8", errors = "surrogateescape")
+
+	def execute(self, cmdline):
+		# Run a command within this process and capture everything it
+		# prints. Errors (including those of the argument parser) are
+		# reported through the return code instead of terminating.
+		stdout = self._capture_stream()
+		stderr = self._capture_stream()
+		with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+			try:
+				result = self.run(cmdline, silent = True)
+				returncode = getattr(result, "returncode", 0)
+			except SystemExit as e:
+				returncode = e.code if isinstance(e.code, int) else (0 if (e.code is None) else 1)
+			except Exception as e:
+				print("%s: %s" % (e.__class__.__name__, str(e)), file = sys.stderr)
+				returncode = 1
+		return self.ExecutionResult(returncode = returncode, stdout = self._captured_text(stdout), stderr = self._captured_text(stderr))
 
 if __name__ == "__main__":
 	mc = MultiCommand()
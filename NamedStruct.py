@@ -31,11 +31,33 @@ class NamedStruct():
 		struct_format = struct_extra + ("".join(fieldtype for (fieldtype, fieldname) in fields))
 		self._struct = struct.Struct(struct_format)
 		self._collection = collections.namedtuple("Fields", [ fieldname for (fieldtype, fieldname) in fields ])
+		self._fieldtypes = tuple(fieldtype for (fieldtype, fieldname) in fields)
+		self._fields = { }
+		for (index, (fieldtype, fieldname)) in enumerate(fields):
+			offset = struct.calcsize(struct_extra + "".join(fieldtype for (fieldtype, fieldname) in fields[:index]))
+			self._fields[fieldname] = (offset, struct.Struct(struct_extra + fieldtype))
 
 	@property
 	def size(self):
 		return self._struct.size
 
+	@property
+	def fieldnames(self):
+		return self._collection._fields
+
+	@property
+	def fieldtypes(self):
+		return self._fieldtypes
+
+	def offsetof(self, fieldname):
+		return self._fields[fieldname][0]
+
+	def field_struct(self, fieldname):
+		return self._fields[fieldname][1]
+
+	def create(self, data):
+		return self._collection(**data)
+
 	def pack(self, data):
 		fields = self._collection(**data)
 		return self._struct.pack(*fields)
@@ -0,0 +1,183 @@
+#	dspbptk - Dyson Sphere Program Blueprint Toolkit
+#	Copyright (C) 2021-2022 Johannes Bauer
+#
+#	This file is part of dspbptk.
+#
+#	dspbptk is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	dspbptk is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+
+import sys
+import time
+import threading
+import tracemalloc
+import contextlib
+import collections
+
+class ProfileStage():
+	# A stage that is being measured. The code inside the stage may set
+	# bytes_out (and bytes_in, if it was not known in advance).
+	__slots__ = [ "name", "bytes_in", "bytes_out", "_t0", "_memory_start", "_memory_peak" ]
+
+	def __init__(self, name, bytes_in = None):
+		self.name = name
+		self.bytes_in = bytes_in
+		self.bytes_out = None
+
+	def __enter__(self):
+		stack = Profiler.stage_stack()
+		if tracemalloc.is_tracing():
+			# The peak is reset for every stage; the enclosing stage keeps
+			# track of the maximum it has observed before.
+			(current, peak) = tracemalloc.get_traced_memory()
+			if len(stack) > 0:
+				stack[-1]._memory_peak = max(stack[-1]._memory_peak, peak)
+			tracemalloc.reset_peak()
+			self._memory_start = current
+			self._memory_peak = current
+		stack.append(self)
+		self._t0 = time.perf_counter()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		duration = time.perf_counter() - self._t0
+		stack = Profiler.stage_stack()
+		stack.pop()
+		memory_peak = None
+		if tracemalloc.is_tracing():
+			peak = max(self._memory_peak, tracemalloc.get_traced_memory()[1])
+			memory_peak = peak - self._memory_start
+			if len(stack) > 0:
+				stack[-1]._memory_peak = max(stack[-1]._memory_peak, peak)
+		Profiler.report(Profiler.StageRecord(name = self.name, duration = duration, bytes_in = self.bytes_in, bytes_out = self.bytes_out, memory_peak = memory_peak))
+
+class _InactiveStage():
+	# Used while nobody is listening, so that instrumented code costs next
+	# to nothing. Assignments to bytes_in/bytes_out are simply discarded.
+	__slots__ = [ ]
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		pass
+
+	def __setattr__(self, name, value):
+		pass
+
+class Profiler():
+	StageRecord = collections.namedtuple("StageRecord", [ "name", "duration", "bytes_in", "bytes_out", "memory_peak" ])
+	_INACTIVE_STAGE = _InactiveStage()
+	_hooks = [ ]
+	_local = threading.local()
+
+	@classmethod
+	def add_hook(cls, hook):
+		# Every hook is called with a StageRecord whenever a stage finishes.
+		# Hooks may be called from worker threads.
+		cls._hooks = cls._hooks + [ hook ]
+
+	@classmethod
+	def remove_hook(cls, hook):
+		cls._hooks = [ registered for registered in cls._hooks if (registered != hook) ]
+
+	@classmethod
+	def stage(cls, name, bytes_in = None):
+		if len(cls._hooks) == 0:
+			return cls._INACTIVE_STAGE
+		return ProfileStage(name, bytes_in = bytes_in)
+
+	@classmethod
+	def stage_stack(cls):
+		if not hasattr(cls._local, "stack"):
+			cls._local.stack = [ ]
+		return cls._local.stack
+
+	@classmethod
+	def report(cls, record):
+		for hook in cls._hooks:
+			hook(record)
+
+	@classmethod
+	@contextlib.contextmanager
+	def session(cls, trace_memory = False, cprofile_filename = None, report_file = None):
+		# Collects stage statistics (and optionally memory peaks and a
+		# cProfile dump) for everything that runs inside the session and
+		# prints a report at the end. Tracing memory slows down allocation
+		# heavy stages considerably, so their times are less meaningful.
+		statistics = StageStatistics()
+		cls.add_hook(statistics)
+		if trace_memory:
+			tracemalloc.start()
+		if cprofile_filename is not None:
+			import cProfile
+			profile = cProfile.Profile()
+			profile.enable()
+		t0 = time.perf_counter()
+		try:
+			yield statistics
+		finally:
+			duration = time.perf_counter() - t0
+			if cprofile_filename is not None:
+				profile.disable()
+				profile.dump_stats(cprofile_filename)
+			if trace_memory:
+				tracemalloc.stop()
+			cls.remove_hook(statistics)
+			report_file = report_file or sys.stderr
+			statistics.print_report(report_file)
+			print("Total wall time: %.2f ms" % (duration * 1000), file = report_file)
+			if cprofile_filename is not None:
+				print("cProfile statistics written to %s (inspect with \"python3 -m pstats %s\")" % (cprofile_filename, cprofile_filename), file = report_file)
+
+class StageStatistics():
+	# Hook that accumulates all records per stage name. Quantities that no
+	# record of a stage reported remain None.
+	Statistics = collections.namedtuple("Statistics", [ "calls", "duration", "bytes_in", "bytes_out", "memory_peak" ])
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._stages = { }
+
+	def __call__(self, record):
+		with self._lock:
+			previous = self._stages.get(record.name, self.Statistics(calls = 0, duration = 0, bytes_in = None, bytes_out = None, memory_peak = None))
+			self._stages[record.name] = self.Statistics(
+				calls = previous.calls + 1,
+				duration = previous.duration + record.duration,
+				bytes_in = self._combine(previous.bytes_in, record.bytes_in, lambda x, y: x + y),
+				bytes_out = self._combine(previous.bytes_out, record.bytes_out, lambda x, y: x + y),
+				memory_peak = self._combine(previous.memory_peak, record.memory_peak, max),
+			)
+
+	@staticmethod
+	def _combine(previous, value, operation):
+		if previous is None:
+			return value
+		if value is None:
+			return previous
+		return operation(previous, value)
+
+	@property
+	def stages(self):
+		with self._lock:
+			return dict(self._stages)
+
+	def print_report(self, f = None):
+		f = f or sys.stderr
+		print("%-28s %7s %11s %12s %12s %12s" % ("Stage", "Calls", "Time [ms]", "In [kB]", "Out [kB]", "Peak [kB]"), file = f)
+		kilobytes = lambda value: "-" if (value is None) else "%.1f" % (value / 1024)
+		for (name, statistics) in sorted(self.stages.items(), key = lambda item: -item[1].duration):
+			print("%-28s %7d %11.2f %12s %12s %12s" % (name, statistics.calls, statistics.duration * 1000, kilobytes(statistics.bytes_in), kilobytes(statistics.bytes_out), kilobytes(statistics.memory_peak)), file = f)
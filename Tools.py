@@ -18,7 +18,10 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
+import os
+import sys
 import datetime
+import contextlib
 
 class DateTimeTools():
 	_CSHARP_EPOCH = datetime.datetime(1, 1, 1, 0, 0, 0)
@@ -32,9 +35,55 @@ class DateTimeTools():
 
 	@classmethod
 	def datetime_to_csharp(cls, datetime):
-		seconds = (datetime - cls._CSHARP_EPOCH).total_seconds()
-		return int(seconds) * 10000000
+		delta = datetime - cls._CSHARP_EPOCH
+		return (((delta.days * 86400) + delta.seconds) * 10000000) + (delta.microseconds * 10)
 
 	@classmethod
 	def csharp_now(cls):
 		return cls.datetime_to_csharp(datetime.datetime.utcnow())
+
+class FileTools():
+	# A filename of "-" denotes stdin (for reading) or stdout (for writing).
+	STDIO = "-"
+
+	@classmethod
+	def is_stdio(cls, filename):
+		return filename == cls.STDIO
+
+	@classmethod
+	def file_exists(cls, filename):
+		return (not cls.is_stdio(filename)) and os.path.exists(filename)
+
+	@classmethod
+	@contextlib.contextmanager
+	def open_input(cls, filename, mode = "r"):
+		if cls.is_stdio(filename):
+			yield sys.stdin.buffer if ("b" in mode) else sys.stdin
+		else:
+			with open(filename, mode) as f:
+				yield f
+
+	@classmethod
+	@contextlib.contextmanager
+	def open_output(cls, filename, mode = "w"):
+		if cls.is_stdio(filename):
+			f = sys.stdout.buffer if ("b" in mode) else sys.stdout
+			yield f
+			f.flush()
+		else:
+			with open(filename, mode) as f:
+				yield f
+
+	@classmethod
+	def find_files(cls, paths, extension = ".txt"):
+		# Yields all given files and, for directories, all files with the
+		# given extension below them (in sorted order).
+		for path in paths:
+			if not os.path.isdir(path):
+				yield path
+				continue
+			for (dirname, subdirs, filenames) in os.walk(path):
+				subdirs.sort()
+				for filename in sorted(filenames):
+					if filename.endswith(extension):
+						yield os.path.join(dirname, filename)